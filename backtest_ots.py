@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from predict_ots import (
+    adjust_changepoint,
+    fit_player_model,
+    make_admetrix_getter,
+    make_holidays,
+    predict_player,
+    prepare_player_data,
+    PROPHET_PARAMS,
+)
+
+
+def rolling_origins(ds, n_folds, horizon_hours, step_hours):
+    '''
+    Точки отсечения для rolling-origin кросс-валидации. Последняя точка оставляет ровно horizon_hours часов данных,
+    предыдущие сдвинуты назад на step_hours
+    :param ds: часы, для которых есть данные
+    :param n_folds: число точек отсечения
+    :param horizon_hours: горизонт прогноза в часах
+    :param step_hours: шаг между точками отсечения в часах
+    :return: точки отсечения по возрастанию
+    '''
+    last_cutoff = ds.max() + pd.Timedelta(hours=1) - pd.Timedelta(hours=horizon_hours)
+    cutoffs = [last_cutoff - pd.Timedelta(hours=step_hours * fold) for fold in range(n_folds)]
+    return sorted(cutoff for cutoff in cutoffs if cutoff > ds.min())
+
+
+def forecast_errors(y_true, y_pred):
+    '''
+    :param y_true: фактический часовой OTS
+    :param y_pred: прогнозный часовой OTS
+    :return: MAE и MAPE(в процентах). часы без фактических данных и с нулевым OTS не учитываются
+    '''
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    mask = ~np.isnan(y_true) & (y_true != 0)
+    if not mask.any():
+        return {'mae': None, 'mape': None}
+
+    errors = np.abs(y_true[mask] - y_pred[mask])
+    return {
+        'mae': float(errors.mean()),
+        'mape': float((errors / np.abs(y_true[mask])).mean() * 100),
+    }
+
+
+def backtest_player(player_id, X, player_admetrix, changepoint, holidays, prophet_params, n_folds, horizon_hours,
+                    step_hours):
+    '''
+    Rolling-origin кросс-валидация прогноза одного плеера, выполняется в отдельном процессе
+    :param player_id: ID плеера
+    :param X: данные плеера, см. predict_ots.prepare_player_data
+    :param player_admetrix: данные Admetrix плеера с индексом по месяцам
+    :param changepoint: дата замены оборудования или None. корректировка считается только по обучающей части
+    Остальные параметры см. backtest
+    :return: метрики и время обучения/прогноза по каждой точке отсечения и в среднем по плееру
+    '''
+    get_admetrix_ots = make_admetrix_getter(player_admetrix)
+
+    folds = list()
+    for cutoff in rolling_origins(X.ds, n_folds, horizon_hours, step_hours):
+        train = X[X.ds < cutoff]
+        test = X[(X.ds >= cutoff) & (X.ds < cutoff + pd.Timedelta(hours=horizon_hours))]
+        if train.y.count() < 2 or not test.y.count():
+            continue
+        if changepoint is not None and (train.ds < changepoint).any() and (train.ds >= changepoint).any():
+            train = adjust_changepoint(train, changepoint)
+
+        logging.info(f'backtesting {player_id} at {cutoff}')
+        ns_fit_start = time.time_ns()
+        m = fit_player_model(train, get_admetrix_ots, holidays, prophet_params)
+        ns_predict_start = time.time_ns()
+        pred = predict_player(m, test[['ds']], get_admetrix_ots, train.y.max())
+        ns_predict_stop = time.time_ns()
+
+        folds.append({
+            'cutoff': cutoff.isoformat(),
+            'hours': int(test.y.count()),
+            **forecast_errors(test.y.values, pred.yhat.values),
+            'fit-time-ms': (ns_predict_start - ns_fit_start) / 1e6,
+            'predict-time-ms': (ns_predict_stop - ns_predict_start) / 1e6,
+        })
+
+    return {
+        'player_id': int(player_id),
+        'folds': folds,
+        **_mean_metrics(folds),
+    }
+
+
+def backtest(
+    df,
+    admetrix_data,
+    changepoints,
+    n_folds=4,
+    horizon_hours=7 * 24,
+    step_hours=7 * 24,
+    holidays=None,
+    prophet_params=None,
+    workers=None,
+):
+    '''
+    Бэктестинг predict_ots: rolling-origin кросс-валидация по каждому плееру, плееры обрабатываются параллельно
+    :param df: данные, собранные predict_ots.build_df
+    :param admetrix_data: данные Admetrix, см. predict_ots.get_admetrix_data
+    :param changepoints: даты замены оборудования {player_id: [date]}
+    :param n_folds: число точек отсечения на плеер
+    :param horizon_hours: горизонт прогноза в часах
+    :param step_hours: шаг между точками отсечения в часах
+    :param holidays: праздничные дни, по умолчанию predict_ots.make_holidays()
+    :param prophet_params: гиперпараметры Prophet, по умолчанию predict_ots.PROPHET_PARAMS
+    :param workers: число процессов. None - по числу ядер
+    :return: отчет с метриками MAE/MAPE и временем обучения/прогноза по плеерам и в целом
+    '''
+    if holidays is None:
+        holidays = make_holidays()
+    prophet_params = prophet_params or PROPHET_PARAMS
+
+    player_ids = list(df.player_id.unique())
+    tasks = list()
+    for player_id in player_ids:
+        changepoint = (changepoints.get(player_id) or [None])[0]
+        tasks.append((
+            player_id,
+            prepare_player_data(df, player_id),
+            admetrix_data[admetrix_data.PlayerId == player_id].set_index('month'),
+            changepoint,
+        ))
+
+    ns_start = time.time_ns()
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, max(len(tasks), 1))) as executor:
+        futures = [
+            executor.submit(
+                backtest_player, *task, holidays, prophet_params, n_folds, horizon_hours, step_hours
+            )
+            for task in tasks
+        ]
+        players = [future.result() for future in futures]
+    ns_stop = time.time_ns()
+
+    return {
+        'settings': {
+            'n_folds': n_folds,
+            'horizon_hours': horizon_hours,
+            'step_hours': step_hours,
+            'prophet_params': prophet_params,
+        },
+        'players': {str(player['player_id']): player for player in players},
+        'summary': {
+            **_mean_metrics(players),
+            'wall-time-ms': (ns_stop - ns_start) / 1e6,
+        },
+    }
+
+
+def compare_reports(report, baseline):
+    '''
+    Сравнить отчет бэктестинга с базовым
+    :return: разница метрик summary(report - baseline)
+    '''
+    return {
+        metric: value - baseline['summary'][metric]
+        for metric, value in report['summary'].items()
+        if value is not None and baseline['summary'].get(metric) is not None
+    }
+
+
+def write_report(report, path):
+    '''
+    Сохранить отчет бэктестинга в json
+    :param report: отчет, см. backtest
+    :param path: путь к файлу
+    '''
+    with open(path, 'w') as output:
+        json.dump(report, output, indent=2, ensure_ascii=False)
+
+
+def read_report(path):
+    with open(path) as input:
+        return json.load(input)
+
+
+def _mean_metrics(items):
+    '''
+    :param items: элементы с метриками mae, mape, fit-time-ms, predict-time-ms
+    :return: средние значения метрик по элементам, для которых они посчитаны
+    '''
+    result = dict()
+    for metric in ('mae', 'mape', 'fit-time-ms', 'predict-time-ms'):
+        values = [item[metric] for item in items if item.get(metric) is not None]
+        result[metric] = float(np.mean(values)) if values else None
+    return result
+
+
+if __name__ == '__main__':
+    import sys
+
+    from cli import main
+
+    sys.exit(main(['backtest'] + sys.argv[1:]))
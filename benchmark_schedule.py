@@ -0,0 +1,90 @@
+'''
+Бенчмарк времени решения задачи подбора частот для разных постановок модели на кампаниях разного размера
+'''
+import logging
+import time
+from datetime import timedelta
+
+from make_schedule import Schedule, slots_ots
+
+# Постановки модели, которые сравниваются в бенчмарке: имя -> параметры Schedule
+BENCHMARK_MODES = {
+    'weighted': {'objective': 'weighted'},
+    'lexicographic': {'objective': 'lexicographic'},
+    'chunked-1': {'chunk_size': 1},
+    'aggregated': {'formulation': 'aggregated'},
+    'decomposed-screen': {'decomposition': 'screen'},
+    'decomposed-week': {'decomposition': 'week'},
+}
+
+
+def benchmark(
+    planned_schedule,
+    ots_forecast,
+    screen_ids,
+    start_date,
+    days,
+    hours,
+    modes=tuple(BENCHMARK_MODES),
+    fill_rate=0.5,
+    frequency=72,
+    chunk_size=3,
+    time_limit=None,
+):
+    '''
+    Решить одни и те же кампании в разных постановках и сравнить время решения и качество
+    :param planned_schedule: текущее расписание активных рекламных кампаний
+    :param ots_forecast: прогноз кол-ва OTS по скринам и часам
+    :param screen_ids: идентификаторы экранов
+    :param start_date: дата начала кампаний
+    :param days: длительности кампаний в днях - размеры кампаний
+    :param hours: часы показа
+    :param modes: имена постановок из BENCHMARK_MODES
+    :param fill_rate: доля доступного OTS, которую должна набрать кампания
+    :param frequency: частота показа
+    :param chunk_size: размер чанка, если не задан в постановке
+    :param time_limit: ограничение времени работы солвера в секундах
+    :return: строки отчета: постановка, размер кампании, время решения, излишек OTS и штраф за частоты
+    '''
+    rows = list()
+    for campaign_days in days:
+        campaign = {
+            'screen_ids': screen_ids,
+            'start_date': start_date,
+            'end_date': start_date + timedelta(days=campaign_days),
+            'week_days': list(range(0, 7)),
+            'hours': hours,
+            'frequency': frequency,
+            'ots_forecast': ots_forecast,
+        }
+        all_screens, available_ots = Schedule(planned_schedule).extract_slots(**campaign)
+        desired_ots = int(available_ots * fill_rate)
+
+        for mode in modes:
+            schedule = Schedule(planned_schedule, **{
+                'chunk_size': chunk_size,
+                'time_limit': time_limit,
+                **BENCHMARK_MODES[mode],
+            })
+            ns_start = time.time_ns()
+            result = schedule.make_advertisement_schedule(desired_ots=desired_ots, **campaign)
+            ns_stop = time.time_ns()
+            slot_list = result.get('slots') or list()
+
+            row = {
+                'mode': mode,
+                'days': campaign_days,
+                'slots': sum(map(len, all_screens)),
+                'desired-ots': desired_ots,
+                'ots-forecast': result['ots-forecast'] if result['schedule'] is not None else None,
+                'overshoot': slots_ots(slot_list) - desired_ots if slot_list else None,
+                'penalty': sum(
+                    slot['remains_slots'] - slot['target_slots'] for slot in slot_list
+                ) if result['schedule'] is not None else None,
+                'optimization-time-ms': result.get('optimization-time-ms'),
+                'total-time-ms': (ns_stop - ns_start) / 1e6,
+            }
+            logging.info(f'benchmark {row}')
+            rows.append(row)
+
+    return rows
@@ -0,0 +1,331 @@
+'''
+Единая точка входа для построения расписаний, прогнозов и бэктестинга
+
+    python cli.py schedule --screen-ids 257 --desired-ots 177812 --start-date 2021-09-01 --end-date 2021-10-01
+    python cli.py predict --data-dir /home/gallery/data/ --out-dir /home/gallery/our_data/
+    python cli.py backtest --data-dir /home/gallery/data/ --report backtest.json --baseline backtest_baseline.json
+    python cli.py benchmark --days 1 7 14 --output benchmark.json
+    python cli.py import-time --baseline import_time.json
+
+Модули с тяжелыми зависимостями импортируются внутри команд, поэтому запуск cli не загружает их заранее
+'''
+import argparse
+import json
+import logging
+import pathlib
+import subprocess
+import sys
+
+RESOURCES_PATH = pathlib.Path(__file__).parent / 'resources'
+TESTS_RESOURCES_PATH = pathlib.Path(__file__).parent / 'tests' / 'resources'
+
+# Тяжелые зависимости, которые не должны загружаться при импорте модулей планирования
+HEAVY_MODULES = ('ortools', 'pandas', 'openpyxl', 'prophet')
+
+# Модули и тяжелые зависимости, которые допустимо загружать при их импорте
+IMPORT_BUDGET = {
+    'make_schedule': (),
+    'utils': (),
+    'naive_scheduling': ('pandas',),
+    'predict_ots': ('pandas',),
+    'backtest_ots': ('pandas',),
+    'benchmark_schedule': (),
+}
+
+IMPORT_TIME_CODE = '''
+import json
+import sys
+import time
+
+ns_start = time.perf_counter_ns()
+import {module}
+ns_stop = time.perf_counter_ns()
+print(json.dumps({{
+    'import-time-ms': (ns_stop - ns_start) / 1e6,
+    'heavy-modules': sorted(name for name in {heavy_modules!r} if name in sys.modules),
+}}))
+'''
+
+
+def int_list(value):
+    '''
+    :param value: строка вида "1,2,3" или "10-20"(правая граница не включена)
+    :return: список целых чисел
+    '''
+    if '-' in value:
+        start, stop = value.split('-')
+        return list(range(int(start), int(stop)))
+    return [int(item) for item in value.split(',')]
+
+
+def measure_import_time(module, repeat=3):
+    '''
+    Измерить время импорта модуля в чистом интерпретаторе
+    :param module: имя модуля
+    :param repeat: число запусков, берется минимальное время
+    :return: время импорта в мс и загруженные при импорте тяжелые зависимости
+    '''
+    measurements = list()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_TIME_CODE.format(module=module, heavy_modules=HEAVY_MODULES)],
+            cwd=pathlib.Path(__file__).parent,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        measurements.append(json.loads(output.splitlines()[-1]))
+
+    return min(measurements, key=lambda measurement: measurement['import-time-ms'])
+
+
+def run_schedule(args):
+    import pickle
+    from datetime import datetime
+
+    import pytz
+
+    from make_schedule import Schedule
+    from utils import parse_inventory, SchedulePrinter
+
+    tz = pytz.timezone(args.tz)
+    start_date = tz.localize(datetime.strptime(args.start_date, '%Y-%m-%d'))
+    end_date = tz.localize(datetime.strptime(args.end_date, '%Y-%m-%d'))
+
+    # Загружаем сохраненные прогнозы
+    with open(args.forecast, 'rb') as predictions_stream:
+        forecast = pickle.load(predictions_stream)
+    # Парсим информацию о свободных слотах
+    base_schedule = parse_inventory(args.inventory, args.player_details, tz=tz)
+
+    # Создаем расписание
+    schedule = Schedule(
+        base_schedule,
+        chunk_size=args.chunk_size,
+        tz=tz,
+        decomposition=args.decomposition,
+        workers=args.workers,
+        time_limit=args.time_limit,
+        objective=args.objective,
+        formulation=args.formulation,
+    )
+
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        screen_ids=args.screen_ids,
+        desired_ots=args.desired_ots,
+        start_date=start_date,
+        end_date=end_date,
+        week_days=args.week_days,
+        hours=args.hours,
+        frequency=args.frequency,
+        ots_forecast=forecast,
+    )
+
+    print({key: value for key, value in advertisement_schedule.items() if key not in ('slots', 'campaign')})
+    if advertisement_schedule['schedule'] is None:
+        return 1
+
+    printer = SchedulePrinter(
+        args.template,
+        args.player_details,
+        plan_date_start=start_date,
+        plan_date_stop=end_date,
+        tz=tz,
+    )
+    printer.write_schedule(advertisement_schedule, args.output)
+    return 0
+
+
+def run_predict(args):
+    import pickle
+
+    from predict_ots import build_df, CHANGEPOINTS, get_admetrix_data, predict_ots
+
+    df = build_df(crowd_dir=args.data_dir / 'RowData' / 'crowd')
+
+    admetrix_data = get_admetrix_data(
+        args.data_dir / 'admetrix_data.xlsx',
+        args.data_dir / 'player_details.csv',
+    )
+
+    predictions = predict_ots(
+        df=df,
+        admetrix_data=admetrix_data,
+        changepoints=CHANGEPOINTS,
+        horizon=args.horizon,
+    )
+
+    logging.info(f'writing predictions to {args.out_dir / "predictions.pkl"}')
+    with (args.out_dir / 'predictions.pkl').open('wb') as f:
+        pickle.dump(predictions, f)
+    return 0
+
+
+def run_backtest(args):
+    from backtest_ots import backtest, compare_reports, read_report, write_report
+    from predict_ots import build_df, CHANGEPOINTS, get_admetrix_data
+
+    df = build_df(crowd_dir=args.data_dir / 'RowData' / 'crowd')
+
+    admetrix_data = get_admetrix_data(
+        args.data_dir / 'admetrix_data.xlsx',
+        args.data_dir / 'player_details.csv',
+    )
+
+    report = backtest(
+        df=df,
+        admetrix_data=admetrix_data,
+        changepoints=CHANGEPOINTS,
+        n_folds=args.folds,
+        horizon_hours=args.horizon_hours,
+        step_hours=args.step_hours,
+        workers=args.workers,
+    )
+
+    if args.baseline is not None and args.baseline.exists():
+        logging.info(f'difference with baseline: {compare_reports(report, read_report(args.baseline))}')
+
+    logging.info(f'writing backtest report to {args.report}')
+    write_report(report, args.report)
+    return 0
+
+
+def run_benchmark(args):
+    from datetime import datetime
+
+    import pytz
+
+    from benchmark_schedule import benchmark
+    from utils import pickle_load
+
+    tz = pytz.timezone(args.tz)
+    data = pickle_load(str(args.data))
+    rows = benchmark(
+        planned_schedule=data['schedule'],
+        ots_forecast=data['predictions'],
+        screen_ids=args.screen_ids,
+        start_date=tz.localize(datetime.strptime(args.start_date, '%Y-%m-%d')),
+        days=args.days,
+        hours=args.hours,
+        modes=args.modes,
+        fill_rate=args.fill_rate,
+        chunk_size=args.chunk_size,
+        time_limit=args.time_limit,
+    )
+
+    print(json.dumps(rows, indent=2))
+    if args.output is not None:
+        with args.output.open('w') as output:
+            json.dump(rows, output, indent=2)
+    return 0
+
+
+def run_import_time(args):
+    report = {module: measure_import_time(module, args.repeat) for module in args.modules}
+
+    failed = False
+    for module, measurement in report.items():
+        unexpected_modules = set(measurement['heavy-modules']) - set(IMPORT_BUDGET.get(module, HEAVY_MODULES))
+        if unexpected_modules:
+            logging.error(f'{module} loads {sorted(unexpected_modules)} at import')
+            failed = True
+
+    if args.baseline is not None and args.baseline.exists():
+        with args.baseline.open() as baseline_stream:
+            baseline = json.load(baseline_stream)
+        for module, measurement in report.items():
+            baseline_time = baseline.get(module, {}).get('import-time-ms')
+            if baseline_time is not None and measurement['import-time-ms'] > baseline_time * (1 + args.tolerance):
+                logging.error(
+                    f'{module} import time regressed: {measurement["import-time-ms"]:.1f} ms, '
+                    f'baseline {baseline_time:.1f} ms'
+                )
+                failed = True
+
+    print(json.dumps(report, indent=2))
+    if args.output is not None:
+        with args.output.open('w') as output:
+            json.dump(report, output, indent=2)
+
+    return 1 if failed else 0
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Помощник планирования рекламных кампаний для билбордов')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    schedule_parser = commands.add_parser('schedule', help='построить расписание рекламной кампании')
+    schedule_parser.add_argument('--forecast', type=pathlib.Path, default=RESOURCES_PATH / 'predictions_new.pkl')
+    schedule_parser.add_argument('--inventory', type=pathlib.Path, default=RESOURCES_PATH / 'inventory.xlsx')
+    schedule_parser.add_argument('--player-details', type=pathlib.Path, default=RESOURCES_PATH / 'player_details.csv')
+    schedule_parser.add_argument('--template', type=pathlib.Path, default=RESOURCES_PATH / 'plan_template.xlsx')
+    schedule_parser.add_argument('--output', type=pathlib.Path, default=RESOURCES_PATH / 'sample.xlsx')
+    schedule_parser.add_argument('--screen-ids', type=int_list, default=[257])
+    schedule_parser.add_argument('--desired-ots', type=int, default=177812)
+    schedule_parser.add_argument('--start-date', default='2021-09-01', help='включена, YYYY-MM-DD')
+    schedule_parser.add_argument('--end-date', default='2021-10-01', help='не включена, YYYY-MM-DD')
+    schedule_parser.add_argument('--week-days', type=int_list, default=list(range(0, 7)), help='пн-0, вс - 6')
+    schedule_parser.add_argument('--hours', type=int_list, default=list(range(10, 20)))
+    schedule_parser.add_argument('--frequency', type=int, default=72)
+    schedule_parser.add_argument('--tz', default='Asia/Novosibirsk')
+    schedule_parser.add_argument('--chunk-size', type=int, default=50)
+    schedule_parser.add_argument('--decomposition', choices=['screen', 'week'])
+    schedule_parser.add_argument('--workers', type=int)
+    schedule_parser.add_argument('--time-limit', type=float)
+    schedule_parser.add_argument('--objective', choices=['weighted', 'lexicographic'], default='weighted')
+    schedule_parser.add_argument('--formulation', choices=['chunked', 'aggregated'], default='chunked')
+    schedule_parser.set_defaults(handler=run_schedule)
+
+    predict_parser = commands.add_parser('predict', help='построить прогноз OTS')
+    predict_parser.add_argument('--data-dir', type=pathlib.Path, default=pathlib.Path('/home/gallery/data/'))
+    predict_parser.add_argument('--out-dir', type=pathlib.Path, default=pathlib.Path('/home/gallery/our_data/'))
+    predict_parser.add_argument('--horizon', default='2021-09-30')
+    predict_parser.set_defaults(handler=run_predict)
+
+    backtest_parser = commands.add_parser('backtest', help='бэктестинг прогноза OTS')
+    backtest_parser.add_argument('--data-dir', type=pathlib.Path, default=pathlib.Path('/home/gallery/data/'))
+    backtest_parser.add_argument('--report', type=pathlib.Path,
+                                 default=pathlib.Path('/home/gallery/our_data/backtest.json'))
+    backtest_parser.add_argument('--baseline', type=pathlib.Path,
+                                 default=pathlib.Path('/home/gallery/our_data/backtest_baseline.json'))
+    backtest_parser.add_argument('--folds', type=int, default=4)
+    backtest_parser.add_argument('--horizon-hours', type=int, default=7 * 24)
+    backtest_parser.add_argument('--step-hours', type=int, default=7 * 24)
+    backtest_parser.add_argument('--workers', type=int)
+    backtest_parser.set_defaults(handler=run_backtest)
+
+    benchmark_parser = commands.add_parser('benchmark', help='сравнить время решения разных постановок модели')
+    benchmark_parser.add_argument('--data', type=pathlib.Path, default=TESTS_RESOURCES_PATH / 'test_pairs.pkl',
+                                  help='gzip pickle с ключами predictions и schedule')
+    benchmark_parser.add_argument('--modes', nargs='+', default=['weighted', 'lexicographic'])
+    benchmark_parser.add_argument('--days', type=int, nargs='+', default=[1, 3, 7])
+    benchmark_parser.add_argument('--screen-ids', type=int_list, default=[257, 258, 271, 1548])
+    benchmark_parser.add_argument('--start-date', default='2021-09-06')
+    benchmark_parser.add_argument('--hours', type=int_list, default=list(range(8, 22)))
+    benchmark_parser.add_argument('--tz', default='Asia/Novosibirsk')
+    benchmark_parser.add_argument('--fill-rate', type=float, default=0.5)
+    benchmark_parser.add_argument('--chunk-size', type=int, default=3)
+    benchmark_parser.add_argument('--time-limit', type=float, default=60)
+    benchmark_parser.add_argument('--output', type=pathlib.Path)
+    benchmark_parser.set_defaults(handler=run_benchmark)
+
+    import_time_parser = commands.add_parser('import-time', help='измерить время импорта модулей')
+    import_time_parser.add_argument('--modules', nargs='+', default=list(IMPORT_BUDGET))
+    import_time_parser.add_argument('--repeat', type=int, default=3)
+    import_time_parser.add_argument('--output', type=pathlib.Path)
+    import_time_parser.add_argument('--baseline', type=pathlib.Path)
+    import_time_parser.add_argument('--tolerance', type=float, default=0.5,
+                                    help='допустимый относительный рост времени импорта')
+    import_time_parser.set_defaults(handler=run_import_time)
+
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
+    args = make_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
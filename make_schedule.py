@@ -1,14 +1,18 @@
+import functools
 import itertools as it
+import math
+import os
 import time
 import typing
 from abc import ABC
 from collections import defaultdict
 from datetime import datetime
-from operator import itemgetter
+from operator import itemgetter, or_
 
 import more_itertools as mit
 import pytz
-from ortools.sat.python import cp_model
+
+from utils import make_offset_tables, naive_seconds
 
 # Стандартные чстоты показов
 STANDARD_FREQUENCIES = frozenset([
@@ -19,21 +23,46 @@ HOUR_SLOT_COUNT = max(STANDARD_FREQUENCIES)  # число слотов в одн
 
 OTS_PER_HOUR_MULTIPLIER = 1 / HOUR_SLOT_COUNT
 
+# Целевые функции модели подбора частот, см. FrequencyModel
+OBJECTIVES = frozenset(['weighted', 'lexicographic'])
+
+# Постановки модели подбора частот: по чанкам слотов или по классам часов с близким OTS
+FORMULATIONS = frozenset(['chunked', 'aggregated'])
+
+# Способы разбиения кандидатных слотов на независимые подзадачи
+DECOMPOSITIONS = {
+    'screen': itemgetter('screen'),
+    'week': lambda slot: tuple(slot['date'].isocalendar())[:2],
+}
+
 
 class Schedule(ABC):
     '''
     Этот класс представляет собой модуль, отвечающий за расписание
     Предполагается, что есть базовая информация о том, какие слоты заняты другими рекламными кампаниями
     Этот класс умеет строить расписание по требованиям рекламной кампании см make_advertisement_schedule
-    Кроме того, нужна информация о временной зоне того места, для которого необходимо построение расписания
+    Кроме того, нужна информация о временной зоне того места, для которого необходимо построение расписания.
+    Экраны могут находиться в разных временных зонах, тогда их зоны передаются в screen_timezones
     Чем меньше chunk_size, тем точнее будет подобран OTS, но тем больший разброс может быть в частотах.
     Наоборот, рост chunk_size снижает точность подбора OTS, но сглаживает частоты в разных часах
+    Для очень больших кампаний можно включить decomposition: слоты разбиваются на части по экранам или неделям,
+    части решаются параллельно, а затем небольшой согласующий проход подгоняет суммарный OTS
     '''
 
     def __init__(self, planned_schedule: dict,
                  chunk_size=3,
                  penalty_rate=1e-5,
                  tz=pytz.timezone('Asia/Novosibirsk'),
+                 decomposition=None,
+                 workers=None,
+                 reconcile_size=200,
+                 time_limit=None,
+                 screen_timezones=None,
+                 objective='weighted',
+                 overshoot_tolerance=0,
+                 formulation='chunked',
+                 search_workers=None,
+                 ots_step=100,
                  ):
         '''
         :param planned_schedule: текущее расписание активных рекламных кампаний
@@ -41,11 +70,53 @@ class Schedule(ABC):
             чем он меньше, тем точнее будет подгоняться OTS нового расписания к желаемому, но тем дольше это будет происходить
         :param penalty_rate: уровень штрафа за неравномерность показа рекламы по билбордам. чем больше, тем более равномерно будут распределены показы
         :param tz: временная зона для определения часов
+        :param screen_timezones: временные зоны экранов {screen_id: tz}. для экранов не из словаря используется tz
+        :param decomposition: способ разбиения задачи на подзадачи: None - одна общая модель,
+            'screen' - по экранам, 'week' - по неделям, либо функция slot -> ключ части
+        :param workers: число процессов для решения подзадач. None - по числу ядер
+        :param reconcile_size: число часовых слотов, которые переоптимизируются в согласующем проходе
+            и освобождаются как запас при перепланировании, см. replan
+        :param time_limit: ограничение времени работы солвера на одну модель в секундах. None - без ограничения
+        :param objective: целевая функция: 'weighted' - взвешенная сумма излишка OTS и штрафа,
+            'lexicographic' - сначала минимальный излишек OTS, затем минимальный штраф, см. FrequencyModel
+        :param overshoot_tolerance: допустимое превышение минимального излишка OTS при минимизации штрафа в lexicographic
+        :param formulation: постановка модели: 'chunked' - переменная на чанк из chunk_size слотов, см. FrequencyModel,
+            'aggregated' - переменная на класс часов с близким OTS(см. ots_step), chunk_size не используется,
+            см. AggregatedFrequencyModel
+        :param search_workers: число потоков поиска CP-SAT на одну модель. None - по умолчанию солвера(по числу ядер).
+            при декомпозиции ядра делятся между процессами, см. do_decomposed_optimization_on_frequencies
+        :param ots_step: шаг округления часового OTS при объединении часов в классы в постановке aggregated.
+            1 - объединяются только часы с одинаковым OTS, результат совпадает с chunk_size=1
         '''
+        if objective not in OBJECTIVES:
+            raise ValueError(f'objective {objective} not supported. possible objectives are {set(OBJECTIVES)}')
+        if formulation not in FORMULATIONS:
+            raise ValueError(f'formulation {formulation} not supported. possible formulations are {set(FORMULATIONS)}')
+        if decomposition is not None and not callable(decomposition) and decomposition not in DECOMPOSITIONS:
+            raise ValueError(
+                f'decomposition {decomposition} not supported. possible decompositions are {set(DECOMPOSITIONS)}')
+
         self.planned_schedule = planned_schedule
         self.chunk_size = chunk_size
         self.penalty_rate = penalty_rate
         self.tz = tz
+        self.decomposition = decomposition
+        self.workers = workers
+        self.reconcile_size = reconcile_size
+        self.time_limit = time_limit
+        self.screen_timezones = screen_timezones or {}
+        self.objective = objective
+        self.overshoot_tolerance = overshoot_tolerance
+        self.formulation = formulation
+        self.search_workers = search_workers
+        self.ots_step = ots_step
+
+    def screen_timezone(self, screen_id):
+        '''
+        :param screen_id: идентификатор экрана
+        :return: временная зона экрана
+        '''
+        return self.screen_timezones.get(screen_id, self.tz)
 
     def make_advertisement_schedule(
         self,
@@ -61,10 +132,10 @@ class Schedule(ABC):
         '''
         :param screen_ids: Идентификаторы экранов
         :param desired_ots: Количество рекламных контактов, которое должно быть набрано
-        :param start_date: Дата начала рекламной кампании
-        :param end_date: Дата окончания рекламной кампании
-        :param week_days: Дни недели пн-0, вс - 6
-        :param hours: Идентификаторы часов показа
+        :param start_date: Дата начала рекламной кампании. Дата без временной зоны трактуется как местное время каждого экрана
+        :param end_date: Дата окончания рекламной кампании. Дата без временной зоны трактуется как местное время каждого экрана
+        :param week_days: Дни недели пн-0, вс - 6, по местному времени экрана
+        :param hours: Идентификаторы часов показа по местному времени экрана
         :param frequency: Частота показа
         :param ots_forecast: Прогноз кол-ва OTS по скринам и часам
         :param chunk_size: Число дней в одной пачке численной оптимизации
@@ -73,27 +144,171 @@ class Schedule(ABC):
         if frequency not in STANDARD_FREQUENCIES:
             raise ValueError(f'frequency {frequency} not supported. possible frequencies are {STANDARD_FREQUENCIES}')
 
-        # plan_screens, plan_timestamps, plan_ots, plan_slots = list(), list(), list(), list()
+        all_screens, available_ots = self.extract_slots(
+            screen_ids, start_date, end_date, week_days, hours, frequency, ots_forecast)
+
+        # В случае, сумма OTS по всем доступным слотам меньше требуемой OTS, мы не можем сформировать расписание.
+        # В этом случае возвращаем None в schedule
+        if available_ots < desired_ots:
+            return {
+                'schedule': None,
+                'ots-forecast': available_ots,
+            }
+        else:
+            # Запускаем целочисленную линейную оптимизацию для поиска частот показов на экранах
+            ns_start = time.time_ns()
+            if self.decomposition is None:
+                slot_list = self.do_mip_optimization_on_frequencies(all_screens, desired_ots)
+            else:
+                slot_list = self.do_decomposed_optimization_on_frequencies(all_screens, desired_ots)
+            ns_stop = time.time_ns()
+
+            # Солвер не нашел решение(например, не уложился в time_limit)
+            if slot_list is None:
+                return {
+                    'schedule': None,
+                    'ots-forecast': available_ots,
+                    'optimization-time-ms': (ns_stop - ns_start) / 1e6,
+                }
+
+            result = self.make_schedule_result(slot_list, ns_stop - ns_start)
+            # параметры кампании нужны для последующего перепланирования, см. replan
+            result['campaign'] = {
+                'screen_ids': list(screen_ids),
+                'desired_ots': desired_ots,
+                'start_date': start_date,
+                'end_date': end_date,
+                'week_days': list(week_days),
+                'hours': list(hours),
+                'frequency': frequency,
+            }
+            return result
+
+    def replan(self, previous_result, inventory_delta):
+        '''
+        Инкрементальное перепланирование после изменения свободных слотов(например, другая кампания заняла часы).
+        Пересобираются чанки, в которые попали изменившиеся часы, вместе с запасом из reconcile_size слотов
+        с наименьшим OTS, остальные назначения фиксируются. Если локальная правка не может набрать требуемый OTS, решается вся задача с подсказками из прошлого решения.
+        Изменения применяются к planned_schedule этого объекта, словарь, переданный в конструктор, не меняется
+        :param previous_result: результат make_advertisement_schedule или replan с найденным расписанием
+        :param inventory_delta: изменившиеся остатки слотов в формате planned_schedule {screen_id: {hour: remains}}
+        :return: обновленное расписание и diff {screen_id: {hour_ts: {'previous-slots': ..., 'slots': ...}}}
+        '''
+        if previous_result.get('slots') is None or previous_result.get('campaign') is None:
+            raise ValueError('previous_result has no schedule to replan. replan needs a solved schedule result')
+
+        campaign = previous_result['campaign']
+        # копируем расписание и изменившиеся экраны, чтобы не менять данные вызывающего кода
+        self.planned_schedule = dict(self.planned_schedule)
+        for screen_id, screen_delta in inventory_delta.items():
+            self.planned_schedule[screen_id] = {**self.planned_schedule.get(screen_id, {}), **screen_delta}
+
+        ns_start = time.time_ns()
+        affected_chunks = set()
+        slots = list()
+        for slot in previous_result['slots']:
+            screen_delta = inventory_delta.get(slot['screen'], {})
+            if slot['date'] in screen_delta:
+                slot = dict(slot, remains_slots=min(screen_delta[slot['date']], campaign['frequency']))
+                affected_chunks.add(slot['chunk'])
+            slots.append(slot)
+
+        hints = slot_hints(previous_result['slots'])
+        free_slots = [slot for slot in slots if slot['chunk'] in affected_chunks]
+        fixed_slots = [slot for slot in slots if slot['chunk'] not in affected_chunks]
+        if free_slots:
+            # изменившиеся часы могут только потерять слоты, поэтому вместе с ними освобождаем запас -
+            # reconcile_size слотов с наименьшим OTS(самая мелкая гранулярность подгонки, как в reconcile_parts)
+            fixed_slots.sort(key=itemgetter('forecast_ots'))
+            free_slots.extend(fixed_slots[:self.reconcile_size])
+            fixed_slots = fixed_slots[self.reconcile_size:]
+
+        replanned_slots = list()
+        if free_slots:
+            replanned_slots = self.do_mip_optimization_on_frequencies(
+                [free_slots], campaign['desired_ots'] - slots_ots(fixed_slots), hints=hints)
+            if replanned_slots is None:
+                # локальной правки не хватает, решаем задачу целиком
+                fixed_slots = list()
+                replanned_slots = self.do_mip_optimization_on_frequencies(
+                    [slots], campaign['desired_ots'], hints=hints)
+            if replanned_slots is None:
+                return {
+                    'schedule': None,
+                    'ots-forecast': sum(
+                        slot['forecast_ots'] * slot['remains_slots'] for slot in slots) * OTS_PER_HOUR_MULTIPLIER,
+                }
+        slot_list = fixed_slots + replanned_slots
+        ns_stop = time.time_ns()
+
+        result = self.make_schedule_result(slot_list, ns_stop - ns_start)
+        result['campaign'] = campaign
 
+        diff = defaultdict(dict)
+        for slot in slot_list:
+            previous_slots = hints[slot['screen'], slot['hour_ts']]
+            if previous_slots != slot['target_slots']:
+                diff[slot['screen']][slot['hour_ts']] = {
+                    'previous-slots': previous_slots,
+                    'slots': slot['target_slots'],
+                }
+        result['diff'] = dict(diff)
+
+        return result
+
+    def extract_slots(
+        self,
+        screen_ids: typing.Collection,
+        start_date: datetime,
+        end_date: datetime,
+        week_days: typing.Collection[int],
+        hours: typing.Collection[int],
+        frequency: int,
+        ots_forecast,
+    ):
+        '''
+        Выделить рекламные часовые слоты, для которых мы будем подбирать параметр по частоте
+        Параметры совпадают с параметрами make_advertisement_schedule
+        :return: список слотов по каждому экрану и суммарный доступный OTS
+        '''
         available_ots = 0
         all_screens = list()
+        hours = frozenset(hours)
+        week_days = frozenset(week_days)
+
+        for screen_id in screen_ids:
+            if ots_forecast.get(screen_id) is None:
+                raise ValueError(f'нет плана для экрана {screen_id}')
+
+        # Час и день недели берем из таблиц смещений по зонам, построенных один раз на горизонт планирования
+        all_ts = [ts for screen_id in screen_ids for ts in ots_forecast[screen_id]]
+        offset_tables = make_offset_tables(
+            map(self.screen_timezone, screen_ids), min(all_ts, default=0), max(all_ts, default=0))
+
+        # Даты с временной зоной задают абсолютный момент, даты без зоны - местное время экрана
+        local_bounds = start_date.tzinfo is None
+        if local_bounds:
+            start_bound, end_bound = naive_seconds(start_date), naive_seconds(end_date)
+        else:
+            start_bound, end_bound = start_date.timestamp(), end_date.timestamp()
 
-        # На этом шаге мы выделяем рекламные часовые слоты, для которых мы будем подбирать параметр по частоте.
         for screen_id in screen_ids:
             screen_slots = list()
             planned_ots = self.planned_schedule.get(screen_id, {})
-            screen_forecast_data = ots_forecast.get(screen_id)
-            if screen_forecast_data is None:
-                raise ValueError(f'нет плана для экрана {screen_id}')
+            screen_forecast_data = ots_forecast[screen_id]
+            offset_table = offset_tables[self.screen_timezone(screen_id)]
 
             for screen_forecast_ts, screen_forecast_ots in sorted(screen_forecast_data.items()):
-                screen_forecast_dt = datetime.fromtimestamp(screen_forecast_ts, tz=self.tz)
-                # print(start_date, end_date, screen_forecast_dt, screen_forecast_dt.hour, screen_forecast_dt.weekday(), start_date <= screen_forecast_dt < end_date)
+                screen_local_seconds = offset_table.local_seconds(screen_forecast_ts)
+                screen_bound_ts = screen_local_seconds if local_bounds else screen_forecast_ts
+                screen_hour = offset_table.hour(screen_forecast_ts)
+                screen_week_day = offset_table.weekday(screen_forecast_ts)
                 if (
-                    (start_date <= screen_forecast_dt < end_date)
-                    and (screen_forecast_dt.hour in hours)
-                    and (screen_forecast_dt.weekday() in week_days)
+                    (start_bound <= screen_bound_ts < end_bound)
+                    and (screen_hour in hours)
+                    and (screen_week_day in week_days)
                 ):
+                    screen_forecast_dt = offset_table.datetime(screen_forecast_ts)
                     # столько слотов осталось
                     remains = planned_ots.get(screen_forecast_dt, HOUR_SLOT_COUNT)
 
@@ -102,8 +317,8 @@ class Schedule(ABC):
                         'hour_ts': screen_forecast_ts,
                         'forecast_ots': screen_forecast_ots,
                         'remains_slots': min(remains, frequency),
-                        'hour': screen_forecast_dt.hour,
-                        'week-day': screen_forecast_dt.weekday(),
+                        'hour': screen_hour,
+                        'week-day': screen_week_day,
                         'date': screen_forecast_dt,
                     })
 
@@ -111,70 +326,316 @@ class Schedule(ABC):
 
             all_screens.append(screen_slots)
 
-        # В случае, сумма OTS по всем доступным слотам меньше требуемой OTS, мы не можем сформировать расписание.
-        # В этом случае возвращаем None в schedule
-        if available_ots < desired_ots:
-            return {
-                'schedule': None,
-                'ots-forecast': available_ots,
+        return all_screens, available_ots
+
+    def make_schedule_result(self, slot_list, optimization_time_ns):
+        '''
+        Сформировать итоговое расписание по результатам оптимизации
+        :param slot_list: информация о всех слотах, которые мы должны занять
+        :param optimization_time_ns: время оптимизации в наносекундах
+        :return: Расписание показов рекламного ролика и инфа о частоте
+        '''
+        # Здесь у нас уже есть вся инфа о том, когда, на каком экране, и на сколько слотов показывать рекламу.
+        # Можем сформировать расписание и уточнить OTS
+        schedule = defaultdict(dict)
+        result_ots = 0
+        for screen_chunk_event in slot_list:
+            screen_id = screen_chunk_event['screen']
+            hour = screen_chunk_event['hour_ts']
+            # remains_slots = screen_chunk_event['remains_slots']
+            slots = screen_chunk_event['target_slots']  # необходимое число слотов, которое мы должны занять
+
+            forecast_ots = screen_chunk_event['forecast_ots']  # прогнозный часовой OTS
+
+            # пересчитываем OTS на число слотов и добавляем к общей сумме
+            result_ots += forecast_ots * slots * OTS_PER_HOUR_MULTIPLIER
+
+            schedule[screen_id][hour] = {
+                'slots': slots,
+                'ots': forecast_ots * slots * OTS_PER_HOUR_MULTIPLIER
             }
-        else:
-            # Запускаем целочисленную линейную оптимизацию для поиска частот показов на экранах
+
+        return {
+            'schedule': schedule,
+            'ots-forecast': round(result_ots),
+            'optimization-time-ms': optimization_time_ns / 1e6,
+            'slots': slot_list,
+        }
+
+    def solver_settings(self):
+        '''
+        Параметры, необходимые для решения подзадачи в отдельном процессе
+        '''
+        return {
+            'chunk_size': self.chunk_size,
+            'penalty_rate': self.penalty_rate,
+            'tz': self.tz,
+            'screen_timezones': self.screen_timezones,
+            'objective': self.objective,
+            'overshoot_tolerance': self.overshoot_tolerance,
+            'formulation': self.formulation,
+            'time_limit': self.time_limit,
+            'search_workers': self.search_workers,
+            'ots_step': self.ots_step,
+        }
+
+    def do_decomposed_optimization_on_frequencies(self, all_screens, desired_ots):
+        '''
+        Декомпозиция большой задачи: слоты разбиваются на части (по экранам или неделям),
+        требуемый OTS распределяется между частями пропорционально доступному в них OTS,
+        части решаются параллельно в пуле процессов.
+        После этого согласующий проход переоптимизирует небольшое число слотов,
+        чтобы устранить суммарный недобор или перебор OTS
+        :param all_screens: информация о всех доступных слотах всех экранах
+        :param desired_ots: требуемое кол-во OTS от рекламной кампании
+        :return: информация о всех слотах, которые мы должны занять
+        '''
+        part_key = self.decomposition if callable(self.decomposition) else DECOMPOSITIONS[self.decomposition]
+
+        parts = defaultdict(list)
+        for slot in it.chain.from_iterable(all_screens):
+            parts[part_key(slot)].append(slot)
+        parts = list(parts.values())
+
+        # доступный OTS части с учетом ограничения по частоте
+        parts_ots = [
+            sum(slot['forecast_ots'] * slot['remains_slots'] for slot in part) * OTS_PER_HOUR_MULTIPLIER
+            for part in parts
+        ]
+        total_ots = sum(parts_ots)
+        if total_ots <= 0:
+            return self.do_mip_optimization_on_frequencies(all_screens, desired_ots)
+
+        parts_desired_ots = [desired_ots * part_ots / total_ots for part_ots in parts_ots]
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        cpu_count = os.cpu_count() or 1
+        pool_size = min(self.workers or cpu_count, len(parts))
+        settings = self.solver_settings()
+        # каждый процесс запускает свой солвер, поэтому потоки поиска делим между процессами,
+        # иначе pool_size солверов по cpu_count потоков конкурируют за ядра
+        if settings['search_workers'] is None:
+            settings['search_workers'] = max(1, cpu_count // pool_size)
+        with ProcessPoolExecutor(max_workers=pool_size) as executor:
+            parts_result = list(executor.map(
+                _solve_part, it.repeat(settings), parts, parts_desired_ots
+            ))
+
+        return self.reconcile_parts(parts, parts_result, desired_ots)
+
+    def reconcile_parts(self, parts, parts_result, desired_ots):
+        '''
+        Согласующий проход после декомпозиции.
+        Слоты нерешенных частей и reconcile_size слотов с наименьшим OTS (они дают самую мелкую гранулярность подгонки)
+        переоптимизируются совместно, остальные слоты остаются зафиксированными
+        :param parts: слоты по частям
+        :param parts_result: решения по частям, None для нерешенных частей
+        :param desired_ots: требуемое кол-во OTS от рекламной кампании
+        :return: информация о всех слотах, которые мы должны занять
+        '''
+        free_slots = list()
+        solved_slots = list()
+        for part, part_result in zip(parts, parts_result):
+            if part_result is None:
+                free_slots.extend(part)
+            else:
+                solved_slots.extend(part_result)
+
+        solved_slots.sort(key=itemgetter('forecast_ots'))
+        reconcile_count = min(self.reconcile_size, len(solved_slots))
+        free_slots.extend(solved_slots[:reconcile_count])
+        fixed_slots = solved_slots[reconcile_count:]
+
+        if not free_slots:
+            return fixed_slots
+
+        reconciled_slots = self.do_mip_optimization_on_frequencies(
+            [free_slots], desired_ots - slots_ots(fixed_slots), hints=slot_hints(solved_slots[:reconcile_count]))
+        if reconciled_slots is None:
+            if len(solved_slots) == sum(map(len, parts)):
+                # все части решены, просто не удалось улучшить суммарный OTS
+                return solved_slots
+            return None
+
+        return fixed_slots + reconciled_slots
+
+    def sweep_desired_ots(
+        self,
+        desired_ots_values: typing.Collection[int],
+        screen_ids: typing.Collection,
+        start_date: datetime,
+        end_date: datetime,
+        week_days: typing.Collection[int],
+        hours: typing.Collection[int],
+        frequency: int,
+        ots_forecast,
+    ):
+        '''
+        Параметрический расчет расписаний для набора значений desired_ots при одних и тех же параметрах кампании.
+        Слоты выделяются и модель строится один раз, для каждого значения меняется только правая часть ограничения по OTS,
+        а предыдущее решение используется как подсказка. Значения решаются по убыванию: решение для большего OTS
+        допустимо(с перебором) для меньшего, поэтому подсказка не нарушает ограничение. Декомпозиция не применяется
+        :param desired_ots_values: значения требуемого OTS
+        Остальные параметры совпадают с параметрами make_advertisement_schedule
+        :return: кривая - список результатов по возрастанию desired_ots, в каждом desired-ots, ots-forecast,
+            used-slots, optimization-time-ms и расписание
+        '''
+        if frequency not in STANDARD_FREQUENCIES:
+            raise ValueError(f'frequency {frequency} not supported. possible frequencies are {STANDARD_FREQUENCIES}')
+
+        all_screens, available_ots = self.extract_slots(
+            screen_ids, start_date, end_date, week_days, hours, frequency, ots_forecast)
+
+        curve = list()
+        frequency_model = None
+        hints = None
+        for desired_ots in sorted(desired_ots_values, reverse=True):
+            if available_ots < desired_ots:
+                curve.append({
+                    'desired-ots': desired_ots,
+                    'schedule': None,
+                    'ots-forecast': available_ots,
+                    'optimization-time-ms': 0.0,
+                    'used-slots': 0,
+                })
+                continue
+
             ns_start = time.time_ns()
-            slot_list = self.do_mip_optimization_on_frequencies(all_screens, desired_ots)
+            if frequency_model is None:
+                frequency_model = self.make_frequency_model(all_screens)
+            frequency_model.set_desired_ots(desired_ots)
+            if hints:
+                frequency_model.set_hints(hints)
+            slot_list = frequency_model.solve()
             ns_stop = time.time_ns()
 
-            # Здесь у нас уже есть вся инфа о том, когда, на каком экране, и на сколько слотов показывать рекламу.
-            # Можем сформировать расписание и уточнить OTS
-            schedule = defaultdict(dict)
-            result_ots = 0
-            for screen_chunk_event in slot_list:
-                screen_id = screen_chunk_event['screen']
-                hour = screen_chunk_event['hour_ts']
-                # remains_slots = screen_chunk_event['remains_slots']
-                slots = screen_chunk_event['target_slots']  # необходимое число слотов, которое мы должны занять
+            if slot_list is None:
+                curve.append({
+                    'desired-ots': desired_ots,
+                    'schedule': None,
+                    'ots-forecast': available_ots,
+                    'optimization-time-ms': (ns_stop - ns_start) / 1e6,
+                    'used-slots': 0,
+                })
+                continue
 
-                forecast_ots = screen_chunk_event['forecast_ots']  # прогнозный часовой OTS
+            hints = slot_hints(slot_list)
+            result = self.make_schedule_result(slot_list, ns_stop - ns_start)
+            result['desired-ots'] = desired_ots
+            result['used-slots'] = sum(slot['target_slots'] for slot in slot_list)
+            curve.append(result)
 
-                # пересчитываем OTS на число слотов и добавляем к общей сумме
-                result_ots += forecast_ots * slots * OTS_PER_HOUR_MULTIPLIER
+        return sorted(curve, key=itemgetter('desired-ots'))
 
-                schedule[screen_id][hour] = {
-                    'slots': slots,
-                    'ots': forecast_ots * slots * OTS_PER_HOUR_MULTIPLIER
-                }
+    def make_slot_groups(self, all_screens):
+        '''
+        :param all_screens: информация о всех доступных слотах всех экранах
+        :return: группы слотов с одинаковым числом оставшихся слотов
+        '''
+        # мы группируем все часовые интервалы, где можем разместить рекламу по числу оставшихся слотов
+        return remains_groups(it.chain.from_iterable(all_screens))
 
-            return {
-                'schedule': schedule,
-                'ots-forecast': round(result_ots),
-                'optimization-time-ms': (ns_stop - ns_start) / 1e6,
-            }
+    def make_chunk_groups(self, all_screens):
+        '''
+        :param all_screens: информация о всех доступных слотах всех экранах
+        :return: чанки слотов с одинаковым числом оставшихся слотов
+        '''
+        chunk_groups = list()
+        for slot_group in self.make_slot_groups(all_screens):
+            # каждую группу разбиваем на чанки. это нужно для того, чтобы сократить размерность задачи
+            group_chunks = mit.chunked(slot_group, self.chunk_size)
+            chunk_groups.extend(group_chunks)
+
+        return chunk_groups
+
+    def make_frequency_model(self, all_screens):
+        '''
+        :param all_screens: информация о всех доступных слотах всех экранах
+        :return: модель подбора частот без ограничения на требуемый OTS, см. FrequencyModel
+        '''
+        model_params = {
+            'objective': self.objective,
+            'overshoot_tolerance': self.overshoot_tolerance,
+            'search_workers': self.search_workers,
+        }
+        if self.formulation == 'aggregated':
+            return AggregatedFrequencyModel(
+                self.make_slot_groups(all_screens),
+                self.penalty_rate,
+                self.time_limit,
+                ots_step=self.ots_step,
+                refine_size=self.reconcile_size,
+                **model_params,
+            )
+
+        return FrequencyModel(self.make_chunk_groups(all_screens), self.penalty_rate, self.time_limit, **model_params)
 
-    def do_mip_optimization_on_frequencies(self, all_screens, desired_ots):
+    def do_mip_optimization_on_frequencies(self, all_screens, desired_ots, hints=None):
         '''
         Здесь мы формулируем задачу целочисленного линейного программирования с ограничениями
         Если мы останемся в условиях линейного программирования, мы сохраняем полиномиальную сложность в среднем случае
         :param all_screens: информация о всех доступных слотах всех экранах
         :param desired_ots: требуемое кол-во OTS от рекламной кампании
+        :param hints: известное ранее решение {(screen_id, hour_ts): target_slots} для ускорения поиска
         :return: информация о всех слотах, которые мы должны занять
         '''
+        frequency_model = self.make_frequency_model(all_screens)
+        frequency_model.set_desired_ots(desired_ots)
+        if hints:
+            frequency_model.set_hints(hints)
 
-        chunk_groups = list()
-        # мы группируем все часовые интервалы, где можем разместить рекламу по числу оставшихся слотов
-        for slot_size, slot_group in it.groupby(
-            sorted(it.chain.from_iterable(all_screens), key=itemgetter('remains_slots')),
-            itemgetter('remains_slots')
-        ):
-            # каждую группу разбиваем на чанки. это нужно для того, чтобы сократить размерность задачи
-            group_chunks = mit.chunked(slot_group, self.chunk_size)
-            chunk_groups.extend(group_chunks)
+        return frequency_model.solve()
+
+
+class FrequencyModel:
+    '''
+    CP-SAT модель подбора частот показов по чанкам часовых слотов.
+    Модель строится один раз, после чего требуемый OTS и подсказки можно менять между решениями.
+    ortools импортируется только при построении модели, чтобы импорт модуля оставался быстрым
+
+    Целевая функция задается objective:
+    'weighted' - излишек OTS и штраф за частоты сворачиваются в одну функцию с весом 1 / penalty_rate;
+    'lexicographic' - сначала минимизируется излишек OTS, затем при зафиксированном излишке(с допуском
+    overshoot_tolerance) минимизируется штраф за частоты. Коэффициенты каждой фазы остаются в своем масштабе
+    '''
+
+    def __init__(self, chunk_groups, penalty_rate, time_limit=None, objective='weighted', overshoot_tolerance=0,
+                 search_workers=None):
+        '''
+        :param chunk_groups: чанки слотов с одинаковым числом оставшихся слотов, см. Schedule.make_chunk_groups
+        :param penalty_rate: уровень штрафа за неравномерность показа рекламы по билбордам
+        :param time_limit: ограничение времени работы солвера в секундах(на каждую фазу). None - без ограничения
+        :param objective: 'weighted' или 'lexicographic'
+        :param overshoot_tolerance: допустимое превышение оптимального излишка OTS во второй фазе lexicographic
+        :param search_workers: число потоков поиска солвера. None - по умолчанию солвера
+        '''
+        from ortools.sat.python import cp_model
+
+        self.chunk_groups = chunk_groups
+        self.penalty_rate = penalty_rate
+        self.time_limit = time_limit
+        self.objective = objective
+        self.overshoot_tolerance = overshoot_tolerance
+        self.search_workers = search_workers
+
+        self.model = cp_model.CpModel()
+        self.ots_terms = list()  # данные OTS по занятым рекламным слотам: пары (переменная, коэффициент)
+        max_ots = self.add_variables(cp_model)
+        self.add_ots_constraints(max_ots)
 
-        x = list()  # параметры задачи - сколько слотов в час занимаем
+    def add_variables(self, cp_model):
+        '''
+        Добавить переменные задачи, заполнить ots_terms и penalty_expr
+        :param cp_model: модуль ortools.sat.python.cp_model
+        :return: максимально возможное значение суммы ots_terms
+        '''
+        self.x = list()  # параметры задачи - сколько слотов в час занимаем
+        self.domains = list()  # допустимые значения параметров
         penalties = list()  # штрафы задачи - насколько мы отклонямся от желаемого числа слотов
-        objectives = list()  # данные OTS по занятым рекламным слотам
+        max_ots = 0
 
-        model = cp_model.CpModel()
-        for group_num, chunk_group in enumerate(chunk_groups):
+        for group_num, chunk_group in enumerate(self.chunk_groups):
             # у нас есть группировка по доступным слотам.
             # для каждой группы у нас есть 1 параметр - число показов в час
             # число OTS для группы в этом случае будет равно
@@ -185,39 +646,388 @@ class Schedule(ABC):
             # (OTS1 + ... + OTSn)
             group_total_ots = sum(group['forecast_ots'] for group in chunk_group)
             # домен у нас состоит из допустимых стандартных частот + мы можем занять полностью текущий оставшийся слот
-            domain = cp_model.Domain.FromIntervals(
-                [[v, v] for v in STANDARD_FREQUENCIES if v < num_slots]
-                + [[num_slots, num_slots]]
-            )
+            domain_values = frequency_domain(num_slots)
+            domain = cp_model.Domain.FromValues(domain_values)
 
-            x_var = model.NewIntVarFromDomain(domain, f'{num_slots};{group_total_ots};{group_num}')
-            x.append(x_var)
+            x_var = self.model.NewIntVarFromDomain(domain, f'{num_slots};{group_total_ots};{group_num}')
+            self.x.append(x_var)
+            self.domains.append(domain_values)
             # добавляем штраф
             penalty = (num_slots - x_var)
+            penalties.append(penalty)
             # Чтобы не выходить за границы целочисленной оптимизации, делим все переменные на OTS_PER_HOUR_MULTIPLIER
             # Линейная задача от этого не изменится
-            chunk_obj = x_var * group_total_ots  # * OTS_PER_HOUR_MULTIPLIER
-            penalties.append(penalty)
-            objectives.append(chunk_obj)
+            self.ots_terms.append((x_var, group_total_ots))  # * OTS_PER_HOUR_MULTIPLIER
+            max_ots += group_total_ots * num_slots
+
+        self.penalty_expr = sum(penalties)
+        return max_ots
+
+    def add_ots_constraints(self, max_ots):
+        '''
+        Добавить ограничения по OTS и целевую функцию режима weighted
+        :param max_ots: максимально возможное значение ots_expr
+        '''
+        self.ots_expr = sum(x_var * coefficient for x_var, coefficient in self.ots_terms)
+        self.max_ots = max_ots
+
+        # Правая часть ограничения по OTS проставляется в set_desired_ots
+        self.ots_constraint = self.model.Add(self.ots_expr >= 0)
+        # Верхняя граница OTS нужна второй фазе lexicographic, в остальное время она заведомо выполнена
+        self.ots_upper_constraint = self.model.Add(self.ots_expr <= self.max_ots)
 
+        if self.objective == 'weighted':
+            # Наша задача - минимизировать излишки, не слишком сильно отступая от желаемых параметров по частотам
+            # Делим задачу на penalty_rate. иначе выходим за границу линейной целочисленной задачи
+            self.model.Minimize(
+                self.ots_expr * int(1 / self.penalty_rate) + self.penalty_expr)  # нам нужно минимизировать кол-во ОТС
+
+    def set_desired_ots(self, desired_ots):
+        '''
+        Изменить требуемое кол-во OTS без перестроения модели
+        :param desired_ots: требуемое кол-во OTS от рекламной кампании
+        '''
         # Нам нужно, чтобы OTS >= desired_ots, но у нас все objectives поделены на OTS_PER_HOUR_MULTIPLIER,
         # Значит и констрейнт нужно поправить как OTS/OTS_PER_HOUR_MULTIPLIER >= desired_ots/OTS_PER_HOUR_MULTIPLIER
-        model.Add(sum(objectives) >= desired_ots * int(1 / OTS_PER_HOUR_MULTIPLIER))
+        # Меняем только нижнюю границу домена линейного ограничения в proto модели
+        constraint_proto = self.model.Proto().constraints[self.ots_constraint.Index()]
+        constraint_proto.linear.domain[0] = math.ceil(desired_ots * int(1 / OTS_PER_HOUR_MULTIPLIER))
+
+    def set_ots_upper_bound(self, max_ots):
+        '''
+        :param max_ots: верхняя граница ots_expr
+        '''
+        constraint_proto = self.model.Proto().constraints[self.ots_upper_constraint.Index()]
+        constraint_proto.linear.domain[1] = max_ots
 
-        # Наша задача - минимизировать излишки, не слишком сильно отступая от желаемых параметров по частотам
-        # Делим задачу на penalty_rate. иначе выходим за границу линейной целочисленной задачи
-        model.Minimize(
-            sum(objectives) * int(1 / self.penalty_rate) + sum(penalties))  # нам нужно минимизировать кол-во ОТС
+    def set_hints(self, hints):
+        '''
+        Заменить подсказки солверу
+        :param hints: известное ранее решение {(screen_id, hour_ts): target_slots}
+        '''
+        self.model.ClearHints()
+        for x_var, domain_values, chunk_group in zip(self.x, self.domains, self.chunk_groups):
+            hint = hints.get((chunk_group[0]['screen'], chunk_group[0]['hour_ts']))
+            if hint in domain_values:
+                self.model.AddHint(x_var, hint)
+
+    def make_solver(self):
+        from ortools.sat.python import cp_model
 
         solver = cp_model.CpSolver()
-        status = solver.Solve(model)
+        if self.time_limit is not None:
+            solver.parameters.max_time_in_seconds = self.time_limit
+        if self.search_workers is not None:
+            solver.parameters.num_workers = self.search_workers
+        return solver
 
-        # Если найдено оптимальное решение, проставляем параметры по числу слотов, которое нужно занять рекламным блоком
-        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            chunk_result = list()
-            for chunk_var, chunk_group in zip(x, chunk_groups):
-                chunk_result.extend(dict(**event, target_slots=solver.Value(chunk_var)) for event in chunk_group)
+    def solve(self):
+        '''
+        :return: информация о всех слотах, которые мы должны занять, или None, если решение не найдено
+        '''
+        if self.objective == 'lexicographic':
+            solver = self.solve_lexicographic()
+        else:
+            solver = self.make_solver()
+            if not is_solved(solver.Solve(self.model)):
+                solver = None
 
-            return chunk_result
+        # Если найдено оптимальное решение, проставляем параметры по числу слотов, которое нужно занять рекламным блоком
+        if solver is not None:
+            return self.make_slot_list(solver)
         else:
             return None
+
+    def solve_lexicographic(self):
+        '''
+        Двухфазное решение: минимальный излишек OTS, затем минимальный штраф за частоты при этом излишке
+        :return: солвер с найденным решением или None
+        '''
+        # Фаза 1: минимизируем OTS. Коэффициенты делим на общий делитель, это не меняет оптимум
+        ots_gcd = math.gcd(*(coefficient for _, coefficient in self.ots_terms)) or 1
+        self.model.Minimize(sum(x_var * (coefficient // ots_gcd) for x_var, coefficient in self.ots_terms))
+        ots_solver = self.make_solver()
+        if not is_solved(ots_solver.Solve(self.model)):
+            return None
+
+        # Фаза 2: фиксируем найденный OTS(с допуском) и минимизируем штраф, решение первой фазы - подсказка
+        best_ots = ots_solver.Value(self.ots_expr)
+        self.set_ots_upper_bound(best_ots + int(self.overshoot_tolerance * int(1 / OTS_PER_HOUR_MULTIPLIER)))
+        self.model.ClearHints()
+        for var in self.hint_variables():
+            self.model.AddHint(var, ots_solver.Value(var))
+        self.model.Minimize(self.penalty_expr)
+
+        penalty_solver = self.make_solver()
+        penalty_status = penalty_solver.Solve(self.model)
+        self.set_ots_upper_bound(self.max_ots)
+
+        return penalty_solver if is_solved(penalty_status) else ots_solver
+
+    def hint_variables(self):
+        '''
+        :return: переменные, значения которых передаются во вторую фазу как подсказка
+        '''
+        return self.x
+
+    def make_slot_list(self, solver):
+        '''
+        :param solver: солвер с найденным решением
+        :return: информация о всех слотах, которые мы должны занять
+        '''
+        chunk_result = list()
+        for chunk_var, chunk_group in zip(self.x, self.chunk_groups):
+            # чанк идентифицируется своим первым слотом, это позволяет находить его при перепланировании
+            chunk_id = (chunk_group[0]['screen'], chunk_group[0]['hour_ts'])
+            chunk_result.extend(
+                dict(event, target_slots=solver.Value(chunk_var), chunk=chunk_id) for event in chunk_group)
+
+        return chunk_result
+
+
+class AggregatedFrequencyModel(FrequencyModel):
+    '''
+    Модель подбора частот без разбиения на чанки, размер которой не растет с числом слотов.
+    Часы с одинаковым числом оставшихся слотов и OTS в пределах одного шага ots_step(OTS // ots_step одинаков)
+    объединяются в класс, и для каждого класса заводится одна переменная - суммарное число слотов его часов.
+    Ее домен - все суммы, которые дают допустимые частоты часов класса, см. frequency_sums.
+    Число классов ограничено числом групп по оставшимся слотам * (разброс OTS / ots_step).
+
+    OTS класса считается так: минимальная частота класса F_min учитывается точно по OTS каждого часа,
+    а частота сверх нее - по наименьшему OTS класса. Поэтому фактический OTS не меньше найденного моделью,
+    а превышает его не больше, чем на ots_step * (число слотов сверх F_min) / HOUR_SLOT_COUNT.
+    Штраф за частоты считается точно. После решения частоты раздаются часам класса детерминированно:
+    большие частоты - часам с меньшим OTS, это наименьший фактический OTS при найденной сумме, см. split_frequency_sum.
+    Затем излишек подгоняется согласующим проходом: refine_size слотов с наименьшим OTS переоптимизируются
+    точной моделью(ots_step=1), остальные фиксируются, как в Schedule.reconcile_parts.
+    При ots_step=1 в класс попадают только часы с одинаковым OTS, и задача эквивалентна chunk_size=1(те же OTS и штраф)
+
+    Часы не объединяются в чанки: каждый час - отдельный чанк для перепланирования, см. Schedule.replan
+    '''
+
+    def __init__(self, chunk_groups, penalty_rate, time_limit=None, objective='weighted', overshoot_tolerance=0,
+                 search_workers=None, ots_step=1, refine_size=0):
+        '''
+        :param chunk_groups: группы слотов с одинаковым числом оставшихся слотов, см. Schedule.make_slot_groups
+        :param ots_step: шаг округления часового OTS при объединении часов в классы
+        :param refine_size: число слотов, которые переоптимизируются точной моделью после решения
+        Остальные параметры см. FrequencyModel
+        '''
+        self.ots_step = ots_step
+        self.refine_size = refine_size
+        super().__init__(chunk_groups, penalty_rate, time_limit, objective, overshoot_tolerance, search_workers)
+
+    def add_variables(self, cp_model):
+        '''
+        Добавить переменные классов часов, заполнить ots_terms и penalty_expr
+        :param cp_model: модуль ortools.sat.python.cp_model
+        :return: максимально возможное значение суммы ots_terms
+        '''
+        self.classes = list()  # часы классов по возрастанию OTS
+        self.x = list()  # суммарное число слотов, занятых в часах класса
+        penalties = list()
+        max_ots = 0
+
+        for slot_group in self.chunk_groups:
+            num_slots = slot_group[0]['remains_slots']
+            min_frequency = min(frequency_domain(num_slots))
+            for ots_bucket, slot_class in it.groupby(
+                sorted(slot_group, key=itemgetter('forecast_ots', 'screen', 'hour_ts')),
+                lambda slot: slot['forecast_ots'] // self.ots_step
+            ):
+                slot_class = list(slot_class)
+                class_size = len(slot_class)
+                class_total_ots = sum(slot['forecast_ots'] for slot in slot_class)
+                class_min_ots = slot_class[0]['forecast_ots']
+
+                # домен - все суммы частот class_size часов
+                x_var = self.model.NewIntVarFromDomain(
+                    cp_model.Domain.FromValues(bitmask_values(frequency_sums(num_slots, class_size)[-1])),
+                    f'{num_slots};{ots_bucket};{len(self.classes)}',
+                )
+                # минимальная частота - точно по OTS каждого часа, слоты сверх нее - по наименьшему OTS класса
+                base_ots = min_frequency * (class_total_ots - class_min_ots * class_size)
+                if base_ots:
+                    self.ots_terms.append((self.model.NewConstant(base_ots), 1))
+                self.ots_terms.append((x_var, class_min_ots))
+                # штраф такой же, как у модели по чанкам: недобор до оставшихся слотов по каждому часу
+                penalties.append(num_slots * class_size - x_var)
+
+                self.classes.append(slot_class)
+                self.x.append(x_var)
+                max_ots += class_total_ots * num_slots
+
+        self.penalty_expr = sum(penalties)
+        return max_ots
+
+    def set_desired_ots(self, desired_ots):
+        self.desired_ots = desired_ots
+        super().set_desired_ots(desired_ots)
+
+    def set_hints(self, hints):
+        '''
+        Заменить подсказки солверу. Подсказка класса - суммарное число слотов, если частоты известны для всех часов
+        :param hints: известное ранее решение {(screen_id, hour_ts): target_slots}
+        '''
+        self.model.ClearHints()
+        for slot_class, x_var in zip(self.classes, self.x):
+            frequencies = frequency_domain(slot_class[0]['remains_slots'])
+            class_hints = [hints.get((slot['screen'], slot['hour_ts'])) for slot in slot_class]
+            if all(hint in frequencies for hint in class_hints):
+                self.model.AddHint(x_var, sum(class_hints))
+
+    def solve(self):
+        '''
+        :return: информация о всех слотах, которые мы должны занять, или None, если решение не найдено
+        '''
+        slot_list = super().solve()
+        if slot_list is None or self.ots_step == 1 or not self.refine_size:
+            return slot_list
+
+        return self.refine(slot_list)
+
+    def refine(self, slot_list):
+        '''
+        Согласующий проход: refine_size слотов с наименьшим OTS переоптимизируются точной моделью(ots_step=1),
+        остальные фиксируются. Если точная модель не нашла решение, остается решение по классам
+        :param slot_list: решение модели по классам
+        :return: информация о всех слотах, которые мы должны занять
+        '''
+        slot_list = sorted(slot_list, key=itemgetter('forecast_ots'))
+        free_slots = slot_list[:self.refine_size]
+        fixed_slots = slot_list[self.refine_size:]
+
+        refine_model = AggregatedFrequencyModel(
+            remains_groups(free_slots),
+            self.penalty_rate,
+            self.time_limit,
+            objective=self.objective,
+            overshoot_tolerance=self.overshoot_tolerance,
+            search_workers=self.search_workers,
+        )
+        refine_model.set_desired_ots(self.desired_ots - slots_ots(fixed_slots))
+        refine_model.set_hints(slot_hints(free_slots))
+        refined_slots = refine_model.solve()
+        if refined_slots is None:
+            return slot_list
+
+        return fixed_slots + refined_slots
+
+    def make_slot_list(self, solver):
+        '''
+        Детерминированно раздать суммарное число слотов класса по часам: частоты подбираются от больших к меньшим,
+        большие частоты - часам с меньшим OTS
+        :param solver: солвер с найденным решением
+        :return: информация о всех слотах, которые мы должны занять
+        '''
+        slot_result = list()
+        for slot_class, x_var in zip(self.classes, self.x):
+            slot_frequencies = split_frequency_sum(slot_class[0]['remains_slots'], len(slot_class), solver.Value(x_var))
+            # каждый час - отдельный чанк, перепланирование освобождает только изменившиеся часы
+            slot_result.extend(
+                dict(slot, target_slots=frequency, chunk=(slot['screen'], slot['hour_ts']))
+                for slot, frequency in zip(slot_class, slot_frequencies)
+            )
+
+        return slot_result
+
+
+@functools.lru_cache(maxsize=None)
+def frequency_sums(num_slots, count):
+    '''
+    :param num_slots: число оставшихся слотов в часе
+    :param count: число часов
+    :return: битовые маски достижимых сумм частот для 0..count часов: бит s маски i - сумма s достижима i часами
+    '''
+    sums = [1]
+    for _ in range(count):
+        sums.append(functools.reduce(or_, (sums[-1] << frequency for frequency in frequency_domain(num_slots))))
+    return tuple(sums)
+
+
+def bitmask_values(mask):
+    '''
+    :param mask: битовая маска
+    :return: номера установленных битов
+    '''
+    return [value for value, bit in enumerate(reversed(bin(mask)[2:])) if bit == '1']
+
+
+def split_frequency_sum(num_slots, count, total):
+    '''
+    Разложить сумму частот на частоты count часов, на каждом шаге берется наибольшая частота,
+    после которой остаток еще достижим
+    :param num_slots: число оставшихся слотов в часе
+    :param count: число часов
+    :param total: достижимая сумма частот, см. frequency_sums
+    :return: частоты часов по убыванию
+    '''
+    sums = frequency_sums(num_slots, count)
+    frequencies = sorted(frequency_domain(num_slots), reverse=True)
+    result = list()
+    for remains_count in range(count - 1, -1, -1):
+        frequency = next(
+            frequency for frequency in frequencies
+            if total >= frequency and sums[remains_count] >> (total - frequency) & 1
+        )
+        result.append(frequency)
+        total -= frequency
+    return result
+
+
+def remains_groups(slots):
+    '''
+    :param slots: часовые слоты
+    :return: группы слотов с одинаковым числом оставшихся слотов
+    '''
+    return [
+        list(slot_group) for slot_size, slot_group in it.groupby(
+            sorted(slots, key=itemgetter('remains_slots')),
+            itemgetter('remains_slots')
+        )
+    ]
+
+
+def frequency_domain(num_slots):
+    '''
+    :param num_slots: число оставшихся слотов в часе
+    :return: допустимые частоты: стандартные частоты + мы можем занять полностью оставшийся слот
+    '''
+    return [v for v in STANDARD_FREQUENCIES if v < num_slots] + [num_slots]
+
+
+def is_solved(status):
+    '''
+    :param status: статус решения CP-SAT
+    :return: найдено ли допустимое решение
+    '''
+    from ortools.sat.python import cp_model
+
+    return status == cp_model.OPTIMAL or status == cp_model.FEASIBLE
+
+
+def slots_ots(slot_list):
+    '''
+    :param slot_list: слоты с заполненным target_slots
+    :return: суммарный OTS по занятым слотам
+    '''
+    return sum(slot['forecast_ots'] * slot['target_slots'] for slot in slot_list) * OTS_PER_HOUR_MULTIPLIER
+
+
+def slot_hints(slot_list):
+    '''
+    :param slot_list: слоты с заполненным target_slots
+    :return: подсказки для do_mip_optimization_on_frequencies {(screen_id, hour_ts): target_slots}
+    '''
+    return {(slot['screen'], slot['hour_ts']): slot['target_slots'] for slot in slot_list}
+
+
+def _solve_part(settings, part_slots, part_desired_ots):
+    '''
+    Решение одной части декомпозированной задачи, выполняется в отдельном процессе
+    :param settings: параметры Schedule, см. Schedule.solver_settings
+    :param part_slots: слоты части
+    :param part_desired_ots: требуемое кол-во OTS для части
+    :return: информация о всех слотах части, которые мы должны занять
+    '''
+    return Schedule({}, **settings).do_mip_optimization_on_frequencies([part_slots], part_desired_ots)
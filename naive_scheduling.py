@@ -5,7 +5,9 @@ import pandas as pd
 from utils import DEFAULT_TZ
 
 
-def schedule_simple(forecast, schedule, screen_ids, desired_ots, start_date, end_date, week_days, hours, frequency):
+def schedule_simple(forecast, schedule, screen_ids, desired_ots, start_date, end_date, week_days, hours, frequency,
+                    tz=DEFAULT_TZ, screen_timezones=None):
+    screen_timezones = screen_timezones or {}
     days = [start_date + dt.timedelta(days=n) for n in range((end_date - start_date).days)]
     slots = []
     for day in days:
@@ -13,21 +15,32 @@ def schedule_simple(forecast, schedule, screen_ids, desired_ots, start_date, end
             continue
         for hour in hours:
             start = dt.datetime.combine(day, dt.time(hour))
-            slots.append(pd.Timestamp(DEFAULT_TZ.localize(start)))
+            slots.append(start)
+
+    # один и тот же местный час у экранов из разных временных зон - разные моменты времени
+    slots_screen_slots = [
+        {
+            screen_id: pd.Timestamp(screen_timezones.get(screen_id, tz).localize(slot))
+            for screen_id in screen_ids
+        }
+        for slot in slots
+    ]
 
     mean_hour_ots = float(desired_ots) / len(slots)
     planned = {}
     while sum(planned.values()) < desired_ots:
         ots_so_far = sum(planned.values())
 
-        for n, slot in enumerate(slots, start=1):
-            ts = int(slot.timestamp())
+        for n, screen_slots in enumerate(slots_screen_slots, start=1):
             available_screens = [
                 screen_id for screen_id in screen_ids
-                if schedule[screen_id][slot] >= frequency and
-                   (slot, screen_id) not in planned
+                if schedule[screen_id][screen_slots[screen_id]] >= frequency and
+                   (screen_slots[screen_id], screen_id) not in planned
             ]
-            otses = {screen_id: forecast[screen_id][ts] * (frequency / 72) for screen_id in available_screens}
+            otses = {
+                screen_id: forecast[screen_id][int(screen_slots[screen_id].timestamp())] * (frequency / 72)
+                for screen_id in available_screens
+            }
 
             bigger_otses = {screen_id: ots for screen_id, ots in otses.items() if ots > mean_hour_ots}
             if bigger_otses:
@@ -38,7 +51,7 @@ def schedule_simple(forecast, schedule, screen_ids, desired_ots, start_date, end
                 screen_id = max(otses, key=otses.get)
                 ots = otses[screen_id]
 
-            planned[(slot, screen_id)] = ots
+            planned[(screen_slots[screen_id], screen_id)] = ots
             if sum(planned.values()) >= desired_ots:
                 break
 
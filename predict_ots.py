@@ -1,11 +1,9 @@
 import datetime as dt
 import pathlib
-import pickle
 import logging
 
 import numpy as np
 import pandas as pd
-from prophet import Prophet
 
 from utils import HOLIDAYS
 
@@ -64,67 +62,171 @@ def get_admetrix_data(admetrix_data_path, player_details_path):
     return admetrix
 
 
+# Известные даты замены оборудования по плеерам
+CHANGEPOINTS = {
+    333: ['2021-01-27'],
+    403: ['2021-01-27'],
+    271: ['2021-02-02'],
+    274: ['2021-01-27'],
+    259: ['2021-02-01'],
+    272: ['2021-01-27'],
+    258: ['2021-01-27'],
+    263: ['2021-01-27'],
+    265: ['2021-01-27'],
+    270: ['2021-01-27'],
+    260: ['2021-02-21'],
+    267: ['2021-03-06'],
+    262: ['2021-03-11'],
+    264: ['2021-03-11'],
+    257: ['2021-02-22'],
+    261: ['2021-02-22'],
+    268: ['2021-02-21'],
+    269: ['2021-02-22'],
+    266: ['2021-03-12'],
+    1572: ['2021-03-13'],
+    1548: ['2021-06-28'],
+    1549: ['2021-06-28'],
+}
+
+
+# Гиперпараметры Prophet по умолчанию, качество их подбора проверяется бэктестингом, см. backtest_ots
+PROPHET_PARAMS = {
+    'yearly_seasonality': 3,
+    'daily_seasonality': True,
+    'weekly_seasonality': True,
+    'changepoint_prior_scale': 0.001,
+}
+
+
+def make_holidays():
+    '''
+    :return: датафрейм праздничных дней в формате Prophet
+    '''
+    return pd.DataFrame({
+        'holiday': 'holiday',
+        'ds': pd.to_datetime(HOLIDAYS),
+    })
+
+
+def prepare_player_data(df, player_id):
+    '''
+    Выделить обучающие данные плеера в формате Prophet
+    :param df: данные, собранные build_df
+    :param player_id: ID плеера
+    :return: датафрейм с колонками ds, y. нулевые значения заменены на NaN, пустые края обрезаны
+    '''
+    X = (
+        df[df.player_id == player_id]
+        .rename(columns={'date_hour': 'ds', 'mac_count': 'y'})
+        .filter(items=['ds', 'y'])
+    )
+    X.loc[X.y == 0, 'y'] = np.nan
+    return X.loc[X.y.first_valid_index(): X.y.last_valid_index()]
+
+
+def adjust_changepoint(X, chp_date):
+    '''
+    Привести данные до даты замены оборудования к уровню данных после нее
+    :param X: данные плеера, см. prepare_player_data
+    :param chp_date: дата замены оборудования
+    :return: скорректированные данные
+    '''
+    X = X.copy()
+    adjust_ratio = X[X.ds >= chp_date].y.mean() / X[X.ds < chp_date].y.mean()
+    X.loc[X.ds < chp_date, 'y'] *= adjust_ratio
+    return X
+
+
+def make_admetrix_getter(player_admetrix):
+    '''
+    :param player_admetrix: данные Admetrix плеера с индексом по месяцам
+    :return: функция дата -> среднесуточный OTS Admetrix за ближайший месяц
+    '''
+    def get_admetrix_ots(date):
+        idx = player_admetrix.index.get_indexer([pd.Timestamp(date)], method='nearest')[0]
+        if idx < 0:
+            return np.nan
+        return player_admetrix.iloc[idx]['OTS среднесуточный']
+
+    return get_admetrix_ots
+
+
+def fit_player_model(X, get_admetrix_ots, holidays, prophet_params=None):
+    '''
+    Обучить Prophet на данных одного плеера
+    :param X: данные плеера, см. prepare_player_data
+    :param get_admetrix_ots: см. make_admetrix_getter
+    :param holidays: праздничные дни, см. make_holidays
+    :param prophet_params: гиперпараметры Prophet, по умолчанию PROPHET_PARAMS
+    :return: обученная модель
+    '''
+    # prophet тянет за собой cmdstanpy и matplotlib, поэтому импортируем его только при обучении
+    from prophet import Prophet
+
+    m = Prophet(holidays=holidays, **(prophet_params or PROPHET_PARAMS))
+    X = X.assign(admetrix=X.ds.map(get_admetrix_ots))
+    if not X['admetrix'].isnull().any():
+        m.add_regressor('admetrix')
+
+    m.fit(X)
+    return m
+
+
+def predict_player(m, future, get_admetrix_ots, y_max):
+    '''
+    Построить прогноз обученной моделью и убрать выбросы
+    :param m: модель, см. fit_player_model
+    :param future: датафрейм с колонкой ds - часы, на которые строится прогноз
+    :param get_admetrix_ots: см. make_admetrix_getter
+    :param y_max: максимальное значение в обучающих данных
+    :return: датафрейм с колонками ds, yhat
+    '''
+    future = future.assign(admetrix=future.ds.map(get_admetrix_ots))
+    pred = m.predict(future)[['ds', 'yhat']]
+
+    # Убираем выбросы
+    max_diff = pred.yhat.max() - pred.yhat.min()
+    if max_diff > y_max * 2:
+        pred['yhat'] *= (y_max * 2) / max_diff
+    pred['yhat'] += max(0, -pred.yhat.min())
+
+    return pred
+
+
 def predict_ots(
     df,
     admetrix_data,
     changepoints,
     horizon,
+    holidays=None,
+    prophet_params=None,
 ):
     '''
     Расчет прогнозных значений OTS с учетом данных Admetrix и известных дат замены оборудования
+    :param holidays: праздничные дни, по умолчанию make_holidays()
+    :param prophet_params: гиперпараметры Prophet, по умолчанию PROPHET_PARAMS
     :return dict: возвращаем словарь вида {player_id: {timestamp: ots}}
     '''
+    if holidays is None:
+        holidays = make_holidays()
+
     predictions = {}
 
     for player_id in df.player_id.unique():
-        X = (
-            df[df.player_id == player_id]
-            .rename(columns={'date_hour': 'ds', 'mac_count': 'y'})
-            .filter(items=['ds', 'y'])
-        )
-        X.loc[X.y == 0, 'y'] = np.nan
-        X = X.loc[X.y.first_valid_index(): X.y.last_valid_index()]
+        X = prepare_player_data(df, player_id)
 
         player_admetrix = admetrix_data[admetrix_data.PlayerId == player_id].set_index('month')
-
-        def get_admetrix_ots(date):
-            try:
-                idx = player_admetrix.index.get_loc(pd.Timestamp(date), method='nearest')
-            except KeyError:
-                return np.nan
-            else:
-                return player_admetrix.iloc[idx]['OTS среднесуточный']
+        get_admetrix_ots = make_admetrix_getter(player_admetrix)
 
         if changepoints.get(player_id):
-            chp_date = changepoints[player_id][0]
-            adjust_ratio = X[X.ds >= chp_date].y.mean() / X[X.ds < chp_date].y.mean()
-            X.loc[X.ds < chp_date, 'y'] *= adjust_ratio
-
-        m = Prophet(
-            yearly_seasonality=3,
-            daily_seasonality=True,
-            weekly_seasonality=True,
-            holidays=holidays,
-            changepoint_prior_scale=0.001,
-        )
-        X['admetrix'] = X.ds.map(get_admetrix_ots)
-        if not X['admetrix'].isnull().any():
-            m.add_regressor('admetrix')
+            X = adjust_changepoint(X, changepoints[player_id][0])
 
         logging.info(f'training prophet for {player_id}')
-        m.fit(X)
+        m = fit_player_model(X, get_admetrix_ots, holidays, prophet_params)
         n_hours_to_predict = (pd.Timestamp(horizon) - X.ds.max()).days * 24
         future = m.make_future_dataframe(periods=n_hours_to_predict, freq='H')
-        future['admetrix'] = future.ds.map(get_admetrix_ots)
         logging.info(f'making predictions prophet for {player_id}')
-        forecast = m.predict(future)
-
-        # Убираем выбросы
-        pred = forecast.iloc[-n_hours_to_predict:][['ds', 'yhat']]
-        max_diff = pred.yhat.max() - pred.yhat.min()
-        if max_diff > X.y.max() * 2:
-            pred['yhat'] *= (X.y.max() * 2) / max_diff
-        pred['yhat'] += max(0, -pred.yhat.min())
+        pred = predict_player(m, future.iloc[-n_hours_to_predict:], get_admetrix_ots, X.y.max())
 
         result = dict(zip(
             (pred.ds.astype(int) / 10**9).astype(int), # each hour's start timestamp
@@ -136,55 +238,8 @@ def predict_ots(
 
 
 if __name__ == '__main__':
-    logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.DEBUG)
-
-    data_dir = pathlib.Path('/home/gallery/data/')
-    out_dir = pathlib.Path('/home/gallery/our_data/')
-
-    df = build_df(crowd_dir=data_dir / 'RowData' / 'crowd')
-
-    admetrix_data = get_admetrix_data(
-        data_dir / 'admetrix_data.xlsx',
-        data_dir / 'player_details.csv',
-    )
+    import sys
 
-    holidays = pd.DataFrame({
-        'holiday': 'holiday',
-        'ds': pd.to_datetime(HOLIDAYS),
-    })
-
-    changepoints = {
-        333: ['2021-01-27'],
-        403: ['2021-01-27'],
-        271: ['2021-02-02'],
-        274: ['2021-01-27'],
-        259: ['2021-02-01'],
-        272: ['2021-01-27'],
-        258: ['2021-01-27'],
-        263: ['2021-01-27'],
-        265: ['2021-01-27'],
-        270: ['2021-01-27'],
-        260: ['2021-02-21'],
-        267: ['2021-03-06'],
-        262: ['2021-03-11'],
-        264: ['2021-03-11'],
-        257: ['2021-02-22'],
-        261: ['2021-02-22'],
-        268: ['2021-02-21'],
-        269: ['2021-02-22'],
-        266: ['2021-03-12'],
-        1572: ['2021-03-13'],
-        1548: ['2021-06-28'],
-        1549: ['2021-06-28'],
-    }
-
-    predictions = predict_ots(
-        df=df,
-        admetrix_data=admetrix_data,
-        changepoints=changepoints,
-        horizon='2021-09-30',
-    )
+    from cli import main
 
-    logging.info(f'writing predictions to {predictions.pkl}')
-    with (out_dir / 'predictions.pkl').open('wb') as f:
-        pickle.dump(predictions, f)
+    sys.exit(main(['predict'] + sys.argv[1:]))
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('prophet')
+
+from backtest_ots import backtest, compare_reports, forecast_errors
+
+
+@pytest.fixture()
+def crowd_data():
+    date_hour = pd.date_range('2021-06-01', periods=24 * 28, freq='h')
+    hours = np.arange(len(date_hour))
+    return pd.DataFrame({
+        'date_hour': date_hour,
+        'mac_count': (100 + 50 * np.sin(hours * 2 * np.pi / 24)).round() + 60,
+        'player_id': 257,
+    })
+
+
+@pytest.fixture()
+def admetrix_data():
+    return pd.DataFrame({
+        'PlayerId': [257],
+        'month': [pd.Timestamp('2021-06-01')],
+        'OTS среднесуточный': [1000],
+    })
+
+
+def test_forecast_errors():
+    errors = forecast_errors([100, np.nan, 0, 200], [110, 5, 5, 150])
+
+    assert errors['mae'] == pytest.approx(30)
+    assert errors['mape'] == pytest.approx(17.5)
+
+
+def test_backtest(crowd_data, admetrix_data):
+    report = backtest(crowd_data, admetrix_data, {257: ['2021-06-10']}, n_folds=2, horizon_hours=24, workers=1)
+
+    player_report = report['players']['257']
+    assert len(player_report['folds']) == 2
+    assert all(fold['hours'] == 24 for fold in player_report['folds'])
+    assert player_report['mape'] is not None
+    assert report['summary']['fit-time-ms'] > 0
+    assert compare_reports(report, report)['mae'] == 0
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from benchmark_schedule import benchmark
+
+
+def test_benchmark_objectives(schedule_plan_data):
+    tz = pytz.timezone('Asia/Novosibirsk')
+    rows = benchmark(
+        planned_schedule=schedule_plan_data['schedule'],
+        ots_forecast=schedule_plan_data['predictions'],
+        screen_ids=[257, 258],
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        days=[1],
+        hours=[10, 11],
+        modes=['weighted', 'lexicographic'],
+        time_limit=10,
+    )
+
+    assert [row['mode'] for row in rows] == ['weighted', 'lexicographic']
+    assert all(row['slots'] == 4 for row in rows)
+    assert rows[0]['overshoot'] == rows[1]['overshoot']
+    assert rows[1]['penalty'] <= rows[0]['penalty']
+
+
+def test_benchmark_formulations(schedule_plan_data):
+    tz = pytz.timezone('Asia/Novosibirsk')
+    rows = benchmark(
+        planned_schedule=schedule_plan_data['schedule'],
+        ots_forecast=schedule_plan_data['predictions'],
+        screen_ids=[257, 258],
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        days=[1],
+        hours=[10, 11],
+        modes=['chunked-1', 'aggregated'],
+        time_limit=10,
+    )
+
+    assert [row['mode'] for row in rows] == ['chunked-1', 'aggregated']
+    assert rows[0]['overshoot'] == pytest.approx(rows[1]['overshoot'])
+    assert rows[0]['penalty'] == rows[1]['penalty']
+
+
+def test_benchmark_decompositions(schedule_plan_data):
+    tz = pytz.timezone('Asia/Novosibirsk')
+    rows = benchmark(
+        planned_schedule=schedule_plan_data['schedule'],
+        ots_forecast=schedule_plan_data['predictions'],
+        screen_ids=[257, 258],
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        days=[1],
+        hours=[10, 11],
+        modes=['weighted', 'decomposed-screen'],
+        time_limit=10,
+    )
+
+    assert [row['mode'] for row in rows] == ['weighted', 'decomposed-screen']
+    assert all(row['overshoot'] is not None and row['total-time-ms'] > 0 for row in rows)
+
+
+def test_benchmark_not_solved(schedule_plan_data):
+    tz = pytz.timezone('Asia/Novosibirsk')
+    rows = benchmark(
+        planned_schedule=schedule_plan_data['schedule'],
+        ots_forecast=schedule_plan_data['predictions'],
+        screen_ids=[257],
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        days=[1],
+        hours=[10],
+        modes=['weighted'],
+        fill_rate=2,
+    )
+
+    assert rows[0]['ots-forecast'] is None
+    assert rows[0]['penalty'] is None
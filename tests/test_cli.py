@@ -0,0 +1,17 @@
+import pytest
+
+from cli import IMPORT_BUDGET, int_list, measure_import_time
+
+
+@pytest.mark.parametrize('module', ['make_schedule', 'utils', 'predict_ots'])
+def test_import_does_not_load_heavy_backends(module):
+    measurement = measure_import_time(module, repeat=1)
+
+    assert set(measurement['heavy-modules']) <= set(IMPORT_BUDGET[module])
+    assert measurement['import-time-ms'] > 0
+
+
+def test_int_list():
+    assert int_list('257') == [257]
+    assert int_list('257,258') == [257, 258]
+    assert int_list('10-13') == [10, 11, 12]
@@ -1,8 +1,9 @@
 from datetime import datetime
 
+import pytest
 import pytz
 
-from make_schedule import Schedule
+from make_schedule import STANDARD_FREQUENCIES, Schedule, slots_ots, split_frequency_sum
 
 
 def test_make_schedule_3600(schedule_plan_data):
@@ -116,3 +117,328 @@ def test_make_schedule_2600_x2_t2(schedule_plan_data):
     assert advertisement_schedule['schedule'][257][appropriate_day_1_2]['slots'] == 6
     assert advertisement_schedule['schedule'][257][appropriate_day_2_1]['slots'] == 6
     assert advertisement_schedule['schedule'][257][appropriate_day_2_2]['slots'] == 6
+
+
+def test_make_schedule_decomposed_by_screen(schedule_plan_data):
+    forecast = schedule_plan_data['predictions']
+    base_schedule = schedule_plan_data['schedule']
+    schedule = Schedule(base_schedule, chunk_size=1, decomposition='screen', workers=2, reconcile_size=4)
+    tz = pytz.timezone('Asia/Novosibirsk')
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        screen_ids=[257, 258, 1548, 271],
+        desired_ots=20000,
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        end_date=tz.localize(datetime(2021, 9, 7)),
+        week_days=list(range(0, 7)),
+        hours=[10, 11],
+        frequency=72,
+        ots_forecast=forecast,
+    )
+
+    assert advertisement_schedule['ots-forecast'] == 20000
+    assert sorted(advertisement_schedule['schedule']) == [257, 258, 271, 1548]
+    assert all(len(screen_schedule) == 2 for screen_schedule in advertisement_schedule['schedule'].values())
+
+
+def test_make_schedule_decomposed_not_solved(schedule_plan_data, monkeypatch):
+    schedule = Schedule(schedule_plan_data['schedule'], decomposition='screen')
+    # части и согласующий проход не нашли решение, например, не уложились в time_limit
+    monkeypatch.setattr(schedule, 'do_decomposed_optimization_on_frequencies', lambda all_screens, desired_ots: None)
+    tz = pytz.timezone('Asia/Novosibirsk')
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        screen_ids=[257, 258],
+        desired_ots=2600,
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        end_date=tz.localize(datetime(2021, 9, 7)),
+        week_days=list(range(0, 7)),
+        hours=[10, 11],
+        frequency=72,
+        ots_forecast=schedule_plan_data['predictions'],
+    )
+
+    assert advertisement_schedule['schedule'] is None
+    assert advertisement_schedule['optimization-time-ms'] is not None
+
+
+def test_solver_settings_split_search_workers(schedule_plan_data):
+    schedule = Schedule(schedule_plan_data['schedule'], search_workers=2)
+    assert schedule.solver_settings()['search_workers'] == 2
+    assert schedule.make_frequency_model([]).make_solver().parameters.num_workers == 2
+
+
+def test_make_schedule_unknown_decomposition(schedule_plan_data):
+    with pytest.raises(ValueError):
+        Schedule(schedule_plan_data['schedule'], decomposition='month')
+
+
+def test_make_schedule_screen_timezones(schedule_plan_data):
+    forecast = schedule_plan_data['predictions']
+    base_schedule = schedule_plan_data['schedule']
+    msk = pytz.timezone('Europe/Moscow')
+    tz = pytz.timezone('Asia/Novosibirsk')
+    schedule = Schedule(base_schedule, screen_timezones={258: msk})
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        screen_ids=[257, 258],
+        desired_ots=1000,
+        start_date=datetime(2021, 9, 6),
+        end_date=datetime(2021, 9, 7),
+        week_days=[0],
+        hours=[10],
+        frequency=72,
+        ots_forecast=forecast,
+    )
+
+    assert list(advertisement_schedule['schedule'][257]) == [tz.localize(datetime(2021, 9, 6, 10)).timestamp()]
+    assert list(advertisement_schedule['schedule'][258]) == [msk.localize(datetime(2021, 9, 6, 10)).timestamp()]
+
+
+def test_replan_after_booking(schedule_plan_data):
+    forecast = schedule_plan_data['predictions']
+    base_schedule = schedule_plan_data['schedule']
+    # без запаса освобождаются только чанки с изменившимися часами
+    schedule = Schedule(base_schedule, reconcile_size=0)
+    tz = pytz.timezone('Asia/Novosibirsk')
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        screen_ids=[257],
+        desired_ots=2600,
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        end_date=tz.localize(datetime(2021, 9, 14)),
+        week_days=[0],
+        hours=[1, 15],
+        frequency=72,
+        ots_forecast=forecast,
+    )
+    booked_hour = tz.localize(datetime(2021, 9, 6, 1))
+    untouched_hour = tz.localize(datetime(2021, 9, 13, 15)).timestamp()
+
+    replanned_schedule = schedule.replan(advertisement_schedule, {257: {booked_hour: 0}})
+
+    assert replanned_schedule['ots-forecast'] >= 2600
+    assert replanned_schedule['schedule'][257][booked_hour.timestamp()]['slots'] == 0
+    assert replanned_schedule['schedule'][257][untouched_hour]['slots'] == 6
+    assert replanned_schedule['diff'][257][booked_hour.timestamp()] == {'previous-slots': 6, 'slots': 0}
+    assert untouched_hour not in replanned_schedule['diff'][257]
+    assert schedule.planned_schedule[257][booked_hour] == 0
+    assert base_schedule.get(257, {}).get(booked_hour) != 0
+
+
+def replan_solve_sizes(schedule, monkeypatch):
+    '''
+    :return: размеры задач, которые решает schedule, заполняется при каждом решении
+    '''
+    solve_sizes = list()
+    solve = schedule.do_mip_optimization_on_frequencies
+
+    def counting_solve(all_screens, desired_ots, hints=None):
+        solve_sizes.append(sum(map(len, all_screens)))
+        return solve(all_screens, desired_ots, hints=hints)
+
+    monkeypatch.setattr(schedule, 'do_mip_optimization_on_frequencies', counting_solve)
+    return solve_sizes
+
+
+REPLAN_CAMPAIGN = {
+    'screen_ids': [257, 258],
+    'desired_ots': 60000,
+    'start_date': pytz.timezone('Asia/Novosibirsk').localize(datetime(2021, 9, 6)),
+    'end_date': pytz.timezone('Asia/Novosibirsk').localize(datetime(2021, 9, 9)),
+    'week_days': list(range(0, 7)),
+    'hours': list(range(8, 22)),
+    'frequency': 72,
+}
+
+
+def test_replan_chunk_size_1_locally(schedule_plan_data, monkeypatch):
+    schedule = Schedule(schedule_plan_data['schedule'], chunk_size=1, reconcile_size=10)
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        ots_forecast=schedule_plan_data['predictions'], **REPLAN_CAMPAIGN)
+    booked_hour = pytz.timezone('Asia/Novosibirsk').localize(datetime(2021, 9, 7, 12))
+    solve_sizes = replan_solve_sizes(schedule, monkeypatch)
+
+    replanned_schedule = schedule.replan(advertisement_schedule, {257: {booked_hour: 0}})
+
+    # одно локальное решение: забронированный час и запас, без решения всей задачи
+    assert solve_sizes == [11]
+    assert replanned_schedule['ots-forecast'] >= 60000
+    assert replanned_schedule['schedule'][257][booked_hour.timestamp()]['slots'] == 0
+    assert sum(map(len, replanned_schedule['diff'].values())) <= 11
+
+
+def test_replan_not_solved_result(schedule_plan_data):
+    schedule = Schedule(schedule_plan_data['schedule'])
+    with pytest.raises(ValueError):
+        schedule.replan({'schedule': None, 'ots-forecast': 0}, {})
+
+
+def test_sweep_desired_ots(schedule_plan_data):
+    forecast = schedule_plan_data['predictions']
+    base_schedule = schedule_plan_data['schedule']
+    schedule = Schedule(base_schedule)
+    tz = pytz.timezone('Asia/Novosibirsk')
+    curve = schedule.sweep_desired_ots(
+        desired_ots_values=[3600, 2600, 100000],
+        screen_ids=[257],
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        end_date=tz.localize(datetime(2021, 9, 14)),
+        week_days=[0],
+        hours=[1, 15],
+        frequency=72,
+        ots_forecast=forecast,
+    )
+
+    assert [point['desired-ots'] for point in curve] == [2600, 3600, 100000]
+    assert [point['ots-forecast'] for point in curve[:2]] == [2857, 3752]
+    assert [point['used-slots'] for point in curve] == [24, 33, 0]
+    assert curve[2]['schedule'] is None
+    assert all(point['optimization-time-ms'] is not None for point in curve)
+
+
+@pytest.mark.parametrize('objective', ['weighted', 'lexicographic'])
+def test_make_schedule_2600_x2_t2_objectives(schedule_plan_data, objective):
+    forecast = schedule_plan_data['predictions']
+    base_schedule = schedule_plan_data['schedule']
+    schedule = Schedule(base_schedule, objective=objective)
+    tz = pytz.timezone('Asia/Novosibirsk')
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        screen_ids=[257],
+        desired_ots=2600,
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        end_date=tz.localize(datetime(2021, 9, 14)),
+        week_days=[0],
+        hours=[1, 15],
+        frequency=72,
+        ots_forecast=forecast,
+    )
+
+    assert advertisement_schedule['ots-forecast'] == 2857
+    assert all(
+        hour_data['slots'] == 6 for hour_data in advertisement_schedule['schedule'][257].values()
+    )
+
+
+def test_make_schedule_unknown_objective(schedule_plan_data):
+    with pytest.raises(ValueError):
+        Schedule(schedule_plan_data['schedule'], objective='pareto')
+
+
+@pytest.mark.parametrize('objective', ['weighted', 'lexicographic'])
+def test_make_schedule_2600_x2_t2_aggregated(schedule_plan_data, objective):
+    forecast = schedule_plan_data['predictions']
+    base_schedule = schedule_plan_data['schedule']
+    schedule = Schedule(base_schedule, objective=objective, formulation='aggregated')
+    tz = pytz.timezone('Asia/Novosibirsk')
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        screen_ids=[257],
+        desired_ots=2600,
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        end_date=tz.localize(datetime(2021, 9, 14)),
+        week_days=[0],
+        hours=[1, 15],
+        frequency=72,
+        ots_forecast=forecast,
+    )
+
+    assert advertisement_schedule['ots-forecast'] == 2857
+    assert all(
+        hour_data['slots'] == 6 for hour_data in advertisement_schedule['schedule'][257].values()
+    )
+
+
+@pytest.mark.parametrize('desired_ots', [60000, 62500])
+def test_make_schedule_aggregated_matches_chunk_size_1(schedule_plan_data, desired_ots):
+    tz = pytz.timezone('Asia/Novosibirsk')
+    campaign = {
+        'screen_ids': [257, 258],
+        'desired_ots': desired_ots,
+        'start_date': tz.localize(datetime(2021, 9, 6)),
+        'end_date': tz.localize(datetime(2021, 9, 9)),
+        'week_days': list(range(0, 7)),
+        'hours': list(range(8, 22)),
+        'frequency': 72,
+        'ots_forecast': schedule_plan_data['predictions'],
+    }
+    chunked_slots = Schedule(schedule_plan_data['schedule'], chunk_size=1).make_advertisement_schedule(**campaign)['slots']
+    aggregated_slots = Schedule(
+        schedule_plan_data['schedule'], formulation='aggregated').make_advertisement_schedule(**campaign)['slots']
+
+    assert slots_ots(aggregated_slots) == pytest.approx(slots_ots(chunked_slots))
+    assert sum(slot['target_slots'] for slot in aggregated_slots) == sum(slot['target_slots'] for slot in chunked_slots)
+    assert len({slot['target_slots'] for slot in aggregated_slots}) > 1
+
+
+def test_aggregated_model_merges_equal_hours():
+    slots = [
+        {'screen': 257, 'hour_ts': hour_ts, 'forecast_ots': forecast_ots, 'remains_slots': 72}
+        for hour_ts, forecast_ots in enumerate([3000, 3000, 3000, 4000, 4000, 5000])
+    ]
+    frequency_model = Schedule({}, formulation='aggregated', ots_step=1).make_frequency_model([slots])
+    frequency_model.set_desired_ots(1000)
+    slot_list = frequency_model.solve()
+    chunked_slot_list = Schedule({}, chunk_size=1).do_mip_optimization_on_frequencies([slots], 1000)
+
+    assert len(frequency_model.classes) == 3
+    assert slots_ots(slot_list) == pytest.approx(slots_ots(chunked_slot_list))
+    assert len({slot['chunk'] for slot in slot_list}) == len(slots)
+
+
+def test_aggregated_model_rounds_ots_by_step():
+    slots = [
+        {'screen': 257, 'hour_ts': hour_ts, 'forecast_ots': forecast_ots, 'remains_slots': 72}
+        for hour_ts, forecast_ots in enumerate([3000, 3020, 3090, 4000, 4050, 5000])
+    ]
+    frequency_model = Schedule(
+        {}, formulation='aggregated', ots_step=100, reconcile_size=0).make_frequency_model([slots])
+    frequency_model.set_desired_ots(3000)
+    slot_list = frequency_model.solve()
+    chunked_slot_list = Schedule({}, chunk_size=1).do_mip_optimization_on_frequencies([slots], 3000)
+    extra_slots = sum(slot['target_slots'] - 6 for slot in slot_list)
+
+    assert len(frequency_model.classes) == 3
+    # OTS не меньше требуемого, а расхождение с точным решением не больше ots_step * слоты сверх минимума / 72
+    assert 3000 <= slots_ots(slot_list) <= slots_ots(chunked_slot_list) + 100 * extra_slots / 72
+
+
+def test_aggregated_model_size_does_not_grow_with_slots(schedule_plan_data):
+    tz = pytz.timezone('Asia/Novosibirsk')
+    schedule = Schedule(schedule_plan_data['schedule'], formulation='aggregated')
+    all_screens, _ = schedule.extract_slots(
+        screen_ids=[257, 258, 1548, 271],
+        start_date=tz.localize(datetime(2021, 9, 6)),
+        end_date=tz.localize(datetime(2021, 9, 13)),
+        week_days=list(range(0, 7)),
+        hours=list(range(8, 22)),
+        frequency=72,
+        ots_forecast=schedule_plan_data['predictions'],
+    )
+
+    assert sum(map(len, all_screens)) == 392
+    assert len(schedule.make_frequency_model(all_screens).x) < 100
+
+
+@pytest.mark.parametrize('count, total', [(1, 9), (3, 18), (3, 75), (4, 288)])
+def test_split_frequency_sum(count, total):
+    frequencies = split_frequency_sum(72, count, total)
+
+    assert len(frequencies) == count
+    assert sum(frequencies) == total
+    assert all(frequency in STANDARD_FREQUENCIES for frequency in frequencies)
+
+
+def test_replan_aggregated_locally(schedule_plan_data, monkeypatch):
+    schedule = Schedule(schedule_plan_data['schedule'], formulation='aggregated', reconcile_size=10)
+    advertisement_schedule = schedule.make_advertisement_schedule(
+        ots_forecast=schedule_plan_data['predictions'], **REPLAN_CAMPAIGN)
+    booked_hour = pytz.timezone('Asia/Novosibirsk').localize(datetime(2021, 9, 7, 12))
+    solve_sizes = replan_solve_sizes(schedule, monkeypatch)
+
+    replanned_schedule = schedule.replan(advertisement_schedule, {257: {booked_hour: 0}})
+
+    # одно локальное решение: забронированный час и запас, без решения всей задачи
+    assert solve_sizes == [11]
+    assert replanned_schedule['ots-forecast'] >= 60000
+    assert replanned_schedule['schedule'][257][booked_hour.timestamp()]['slots'] == 0
+
+
+def test_make_schedule_unknown_formulation(schedule_plan_data):
+    with pytest.raises(ValueError):
+        Schedule(schedule_plan_data['schedule'], formulation='dense')
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import pytz
+
+from utils import UtcOffsetTable
+
+
+def test_offset_table_matches_pytz():
+    tz = pytz.timezone('Europe/Berlin')
+    start_ts = int(tz.localize(datetime(2021, 1, 1)).timestamp())
+    end_ts = int(tz.localize(datetime(2022, 1, 1)).timestamp())
+    offset_table = UtcOffsetTable(tz, start_ts, end_ts)
+
+    assert len(offset_table.transitions) == 3
+    for ts in range(start_ts, end_ts, 3600):
+        dt = datetime.fromtimestamp(ts, tz=tz)
+        assert offset_table.hour(ts) == dt.hour
+        assert offset_table.weekday(ts) == dt.weekday()
+        assert offset_table.date(ts) == dt.date()
+        assert offset_table.datetime(ts) == dt
+
+
+def test_offset_table_static_timezone():
+    offset_table = UtcOffsetTable(pytz.utc, 0, 10 * 24 * 3600)
+
+    assert offset_table.offsets == [0]
+    assert offset_table.hour(3600 * 25) == 1
+    assert offset_table.weekday(0) == 3
@@ -1,36 +1,144 @@
+import bisect
 import gzip
 import io
 import pickle
 from collections import defaultdict
 from copy import copy
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 
-import pandas as pd
 import pytz
-from openpyxl import load_workbook
 
 DEFAULT_TZ = pytz.timezone('Asia/Novosibirsk')
 
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+EPOCH_WEEKDAY = EPOCH.weekday()  # 1970-01-01 - четверг
 
-def parse_inventory(inventory_file, screen_file, tz=DEFAULT_TZ):
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 24 * SECONDS_PER_HOUR
+
+
+class UtcOffsetTable:
+    '''
+    Таблица переходов смещения от UTC для временной зоны на горизонте планирования.
+    Строится один раз на зону, после чего час, день недели и дата слота вычисляются арифметикой по timestamp,
+    без вызовов pytz на каждый слот
+    '''
+
+    def __init__(self, tz, start_ts, end_ts):
+        '''
+        :param tz: временная зона
+        :param start_ts: начало горизонта планирования(unix timestamp)
+        :param end_ts: окончание горизонта планирования(unix timestamp)
+        '''
+        self.tz = tz
+        self.transitions, self.offsets = self._build_transitions(tz, int(start_ts), int(end_ts))
+        # смещения фиксированные, поэтому для локальных дат хватает стандартных timezone без pytz
+        self.fixed_zones = {offset: timezone(timedelta(seconds=offset)) for offset in set(self.offsets)}
+
+    @staticmethod
+    def _build_transitions(tz, start_ts, end_ts):
+        '''
+        :return: отсортированные моменты смены смещения и смещения(в секундах), действующие с этих моментов
+        '''
+        utc_transition_times = getattr(tz, '_utc_transition_times', None)
+        if utc_transition_times is not None:
+            # pytz хранит полную историю переходов, берем только горизонт планирования
+            transitions, offsets = list(), list()
+            for transition_dt, (utc_offset, _, _) in zip(utc_transition_times, tz._transition_info):
+                transition_ts = (transition_dt - EPOCH) // timedelta(seconds=1)
+                if transition_ts <= start_ts and transitions:
+                    transitions.pop()
+                    offsets.pop()
+                if transition_ts > end_ts:
+                    break
+                transitions.append(transition_ts)
+                offsets.append(int(utc_offset.total_seconds()))
+            return transitions, offsets
+
+        # для прочих tzinfo один раз проходим по часам горизонта
+        transitions, offsets = list(), list()
+        for ts in range(start_ts - start_ts % SECONDS_PER_HOUR, end_ts + SECONDS_PER_HOUR, SECONDS_PER_HOUR):
+            offset = int(datetime.fromtimestamp(ts, tz=tz).utcoffset().total_seconds())
+            if not offsets or offsets[-1] != offset:
+                transitions.append(ts)
+                offsets.append(offset)
+        return transitions, offsets
+
+    def offset(self, ts):
+        '''
+        :param ts: unix timestamp
+        :return: смещение от UTC в секундах
+        '''
+        return self.offsets[max(bisect.bisect_right(self.transitions, ts) - 1, 0)]
+
+    def local_seconds(self, ts):
+        '''
+        :param ts: unix timestamp
+        :return: число секунд от 1970-01-01 00:00 по локальному времени зоны
+        '''
+        return ts + self.offset(ts)
+
+    def hour(self, ts):
+        return self.local_seconds(ts) // SECONDS_PER_HOUR % 24
+
+    def weekday(self, ts):
+        return (self.local_seconds(ts) // SECONDS_PER_DAY + EPOCH_WEEKDAY) % 7
+
+    def date(self, ts):
+        return date.fromordinal(EPOCH_ORDINAL + self.local_seconds(ts) // SECONDS_PER_DAY)
+
+    def datetime(self, ts):
+        '''
+        :param ts: unix timestamp
+        :return: локальное время с фиксированным смещением(сравнивается и хешируется как pytz-время того же момента)
+        '''
+        return datetime.fromtimestamp(ts, tz=self.fixed_zones[self.offset(ts)])
+
+
+def naive_seconds(dt):
+    '''
+    :param dt: время без временной зоны
+    :return: число секунд от 1970-01-01 00:00 для этого времени, как будто оно задано в UTC
+    '''
+    return (dt - EPOCH) // timedelta(seconds=1)
+
+
+def make_offset_tables(zones, start_ts, end_ts):
+    '''
+    Построить таблицы смещений для всех различных временных зон
+    :param zones: временные зоны
+    :param start_ts: начало горизонта планирования(unix timestamp)
+    :param end_ts: окончание горизонта планирования(unix timestamp)
+    :return: словарь временная зона -> UtcOffsetTable
+    '''
+    return {tz: UtcOffsetTable(tz, start_ts, end_ts) for tz in set(zones)}
+
+
+def parse_inventory(inventory_file, screen_file, tz=DEFAULT_TZ, screen_timezones=None):
     '''
     Загружить данные рекламных слотов по билбордам в пригодный для дальнейшей обработки вид
     :param inventory_file: файл с билбордами(inventory.xlsx)
     :param screen_file: файл с Id билбордов player_details.csv
     :param tz: временная зона, для которой требуется построение расписания
+    :param screen_timezones: временные зоны экранов {screen_id: tz}. для экранов не из словаря используется tz
     :return: данные по свободным рекламным слотам
     '''
+    import pandas as pd
+
+    screen_timezones = screen_timezones or {}
     player_ids_dict = pd.read_csv(screen_file, delimiter=';', index_col='PlayerNumber').to_dict()['PlayerId']
     inventory_df = pd.read_excel(
         inventory_file,
         parse_dates=['Дата'],
-        date_parser=lambda x: tz.localize(datetime.strptime(x, '%Y-%m-%d')),
+        date_parser=lambda x: datetime.strptime(x, '%Y-%m-%d'),
     )
     result_schedule = defaultdict(dict)
-    for date, screen_name, *hours in inventory_df[['Дата', 'ID экрана'] + list(range(24))].values:
+    for inventory_date, screen_name, *hours in inventory_df[['Дата', 'ID экрана'] + list(range(24))].values:
         screen_id = player_ids_dict[screen_name]
+        screen_date = screen_timezones.get(screen_id, tz).localize(pd.Timestamp(inventory_date).to_pydatetime())
         for hour, hour_remains in enumerate(hours):
-            hour_date = date + timedelta(hours=hour)
+            hour_date = screen_date + timedelta(hours=hour)
             result_schedule[screen_id][hour_date] = hour_remains
 
     return dict(result_schedule)
@@ -97,6 +205,7 @@ WEEKDAYS = [
 class SchedulePrinter:
     '''
     Класс для печати расписаний в excel файл
+    pandas и openpyxl импортируются только при использовании, чтобы импорт utils оставался быстрым
     '''
 
     def __init__(
@@ -106,6 +215,7 @@ class SchedulePrinter:
         plan_date_start,
         plan_date_stop,
         tz=DEFAULT_TZ,
+        screen_timezones=None,
     ):
         '''
         :param template_path: файл шаблона plan_template.xlsx
@@ -113,9 +223,13 @@ class SchedulePrinter:
         :param plan_date_start: дата начала расписания
         :param plan_date_stop: дата окончания расписания
         :param tz: временная зона
+        :param screen_timezones: временные зоны экранов {screen_id: tz}. для экранов не из словаря используется tz
         '''
+        import pandas as pd
+
         self.template_path = template_path
         self.timezone = tz
+        self.screen_timezones = screen_timezones or {}
         self.player_details_path = player_details_path
         player_data = pd.read_csv(player_details_path, delimiter=';')
         self.player_name_to_ids = player_data.set_index('PlayerNumber').to_dict()['PlayerId']
@@ -132,6 +246,13 @@ class SchedulePrinter:
             if current_date >= plan_date_stop:
                 break
 
+    def screen_timezone(self, screen_id):
+        '''
+        :param screen_id: идентификатор экрана
+        :return: временная зона экрана
+        '''
+        return self.screen_timezones.get(screen_id, self.timezone)
+
     def truncate_schedule(self, schedule):
         '''
         Обрезать расписание с точностью до дней
@@ -139,10 +260,17 @@ class SchedulePrinter:
         :return: расписание, урезанное с точностью до дней
         '''
         result = defaultdict(lambda: defaultdict(lambda: {'slots': 0, 'ots': 0}))
+        all_ts = [screen_ts for screen_ts_items in schedule.values() for screen_ts in screen_ts_items]
+        if not all_ts:
+            return dict(result)
+
+        offset_tables = make_offset_tables(
+            map(self.screen_timezone, schedule), min(all_ts), max(all_ts))
         for screen_id, screen_ts_items in schedule.items():
             screen_name = self.player_id_to_name[screen_id]
+            offset_table = offset_tables[self.screen_timezone(screen_id)]
             for screen_ts, screen_ts_data in screen_ts_items.items():
-                screen_date = datetime.fromtimestamp(screen_ts, tz=self.timezone).date()
+                screen_date = offset_table.date(int(screen_ts))
 
                 result[screen_name][screen_date]['slots'] += screen_ts_data['slots']
                 result[screen_name][screen_date]['ots'] += screen_ts_data['ots']
@@ -156,6 +284,8 @@ class SchedulePrinter:
         :param filename: файл с расписанием
         :return: excel workbook с расписанием
         '''
+        from openpyxl import load_workbook
+
         workbook = load_workbook(filename=self.template_path)
         ots_sheet = workbook['Медиаплан по OTS']
 
@@ -187,11 +317,11 @@ class SchedulePrinter:
         slots_sheet = workbook['Медиаплан по показам']
 
         for rownum, row in enumerate(slots_sheet.iter_rows(min_row=3, min_col=1, max_col=50)):
-            row_date = self.timezone.localize(datetime.strptime(row[0].value, '%Y-%m-%d'))
-
             board_name = row[3].value
             board_id = int(self.player_name_to_ids[board_name])
 
+            row_date = self.screen_timezone(board_id).localize(datetime.strptime(row[0].value, '%Y-%m-%d'))
+
             board_date_data = schedule['schedule'].get(board_id)
             if board_date_data:
                 total_hour_value = 0